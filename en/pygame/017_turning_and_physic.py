@@ -24,6 +24,9 @@ def game(folder = "data"):
     import os
     import random
     import math 
+    import rotocache # shared cache of rotated images
+    import spritepool # recycle fragments and smoke
+    import particles # smoke and blue fragments in numpy arrays, if numpy is installed
     #------ starting pygame -------------
     pygame.mixer.pre_init(44100, -16, 2, 2048) # setup mixer to avoid sound lag
     pygame.init()
@@ -260,7 +263,7 @@ def game(folder = "data"):
                 self.image0 = Bird.image[self.crashing+self.big] # 0 for not crashing, 1 for crashing
                 #--------- rotate into direction of movement ------------
                 self.angle = math.atan2(-self.dx, -self.dy)/math.pi*180.0 
-                self.image = pygame.transform.rotozoom(self.image0,self.angle,1.0)
+                self.image = rotocache.rotozoom(self.image0,self.angle)
                 #--- calculate new position on screen -----
                 self.rect.centerx = round(self.pos[0],0)
                 self.rect.centery = round(self.pos[1],0)
@@ -362,7 +365,7 @@ def game(folder = "data"):
                 if pressedkeys[pygame.K_d]: # right turn, clockwise
                     self.angle -= self.rotatespeed
                 self.oldcenter = self.rect.center
-                self.image = pygame.transform.rotate(self.image, self.angle)
+                self.image = rotocache.rotate(self.image, self.angle) # self.image is one of the Bird.image
                 self.rect = self.image.get_rect()
                 self.rect.center = self.oldcenter
                 #--- calculate new position on screen -----
@@ -374,6 +377,7 @@ def game(folder = "data"):
     class Fragment(pygame.sprite.Sprite):
         """generic Fragment class. Inherits to blue Fragment (implosion),
            red Fragment (explosion), smoke (black) and shots (purple)"""
+        recycled = False # only sprites of a spritepool.Pooled class are recycled
         def __init__(self, pos, layer = 9):
             self._layer = layer
             pygame.sprite.Sprite.__init__(self, self.groups)
@@ -381,10 +385,13 @@ def game(folder = "data"):
             self.fragmentmaxspeed = FRAGMENTMAXSPEED# try out other factors !
 
         def init2(self):  # split the init method into 2 parts for better access from subclasses
-            self.image = pygame.Surface((10,10))
-            self.image.set_colorkey((0,0,0)) # black transparent
+            if self.recycled: # sprite from the pool: paint its old Surface again
+                self.image.fill((0,0,0,0)) # transparent
+            else:
+                self.image = pygame.Surface((10,10))
+                self.image.set_colorkey((0,0,0)) # black transparent
+                self.image = self.image.convert_alpha()
             pygame.draw.circle(self.image, self.color, (5,5), random.randint(2,5))
-            self.image = self.image.convert_alpha()
             self.rect = self.image.get_rect()
             self.rect.center = self.pos #if you forget this line the sprite sit in the topleft corner
             self.time = 0.0
@@ -398,7 +405,7 @@ def game(folder = "data"):
             self.rect.centerx = round(self.pos[0],0)
             self.rect.centery = round(self.pos[1],0)
     
-    class RedFragment(Fragment):
+    class RedFragment(spritepool.Pooled, Fragment):
         """explodes outward from (killed) Bird"""
         def __init__(self,pos):
             self.groups = allgroup, fragmentgroup, gravitygroup
@@ -413,7 +420,7 @@ def game(folder = "data"):
             self.init2() # continue with generic Fragment class
             self.mass = 48.0
             
-    class BlueFragment(Fragment):
+    class BlueFragment(spritepool.Pooled, Fragment):
         """implode inward toward new Bird (and a bittle outward after
            reaching the target position"""
         def __init__(self, pos):
@@ -440,7 +447,7 @@ def game(folder = "data"):
             self.lifetime = Bird.waittime + random.random() * .5 # a bit more livetime after the Bird appears
             self.init2()
             
-    class Smoke(Fragment):
+    class Smoke(spritepool.Pooled, Fragment):
         """black exhaust indicating that the BigBird sprite is moved by
            the player. Exhaust direction is inverse of players movement direction"""
         def __init__(self, pos, dx, dy):
@@ -460,6 +467,7 @@ def game(folder = "data"):
     class Bullet(Fragment):
         """a bullet flying in the direction of the BigBird's heading. May 
            be subject to gravity"""
+        image0 = None # the unrotated image, shared by all bullets
         def __init__(self, boss, dx, dy):
             self.color = (200,0,200)
             self.boss = boss
@@ -468,15 +476,14 @@ def game(folder = "data"):
             self.pos[0] = self.boss.pos[0]
             self.pos[1] = self.boss.pos[1]
             self.lifetime = 5 # 5 seconds
-            self.image = pygame.Surface((4,20))
-            self.image.set_colorkey((0,0,0)) # black transparent
-            pygame.draw.rect(self.image, self.color, (0,0,4,20) )
-            pygame.draw.rect(self.image, (10,0,0), (0,0,4,4)) # point
-            self.image = self.image.convert_alpha()
-            self.image0 = self.image.copy()
-            self.rect = self.image.get_rect()
-            self.rect.center = self.boss.rect.center
-            self.image = pygame.transform.rotate(self.image, self.boss.angle)
+            if Bullet.image0 is None: # drawn only once, all bullets share it
+                image = pygame.Surface((4,20))
+                image.set_colorkey((0,0,0)) # black transparent
+                pygame.draw.rect(image, self.color, (0,0,4,20) )
+                pygame.draw.rect(image, (10,0,0), (0,0,4,4)) # point
+                Bullet.image0 = image.convert_alpha()
+            self.image0 = Bullet.image0
+            self.image = rotocache.rotate(self.image0, self.boss.angle)
             self.rect = self.image.get_rect()
             self.rect.center = self.boss.rect.center
             self.time = 0.0
@@ -492,7 +499,7 @@ def game(folder = "data"):
             Fragment.update(self,time)
             #--------- rotate into direction of movement ------------
             self.angle = math.atan2(-self.dx, -self.dy)/math.pi*180.0 
-            self.image = pygame.transform.rotozoom(self.image0,self.angle,1.0)
+            self.image = rotocache.rotozoom(self.image0,self.angle)
             
     # ----------------- background artwork -------------  
     background = pygame.Surface((screen.get_width(), screen.get_height()))
@@ -509,7 +516,7 @@ def game(folder = "data"):
     fragmentgroup = pygame.sprite.Group()
     gravitygroup = pygame.sprite.Group()
     # only the allgroup draws the sprite, so i use LayeredUpdates() instead Group()
-    allgroup = pygame.sprite.LayeredUpdates() # more sophisticated, can draw sprites in layers 
+    allgroup = particles.LayeredUpdates() # more sophisticated, can draw sprites in layers, and particles between them
 
     #-------------loading files from data subdirectory -------------------------------
     try: # load images into classes (class variable !). if not possible, draw ugly images
@@ -542,6 +549,15 @@ def game(folder = "data"):
         hitsound = pygame.mixer.Sound(os.path.join(folder,'beep.ogg'))
     except:
         print("could not load one of the sound files from folder %s. no sound, sorry" %folder)
+    # smoke and blue fragments become particles instead of sprites. Red fragments
+    # stay sprites: they hit the birds (fragmentgroup), particles can not collide
+    if particles.numpy is not None:
+        smoke = allgroup.addparticles(particles.ParticleSystem(), 3) # layer of the Smoke sprites
+        sparks = allgroup.addparticles(particles.ParticleSystem(), 9) # layer of the BlueFragment sprites
+        def Smoke(pos, dx, dy):
+            smoke.smoke(pos, dx, dy, lifetime = 1 + random.random()*2) # max 3 seconds, like the Smoke class
+        def BlueFragment(pos):
+            sparks.implode(pos, screen.get_width(), screen.get_height(), 1, Bird.waittime)
     # ------------- before the main loop ----------------------
     screentext = Text()
     clock = pygame.time.Clock()        # create pygame clock object 
@@ -641,10 +657,12 @@ def game(folder = "data"):
             screentext.newmsg("Time left: %.2f" % (gametime - playtime))
         
         # ----------- clear, draw , update, flip -----------------  
-        allgroup.clear(screen, background)
+        allgroup.clear(screen, background) # sprites and particles
+        allgroup.updateparticles(seconds) # smoke and blue fragments do not fall down
         allgroup.update(seconds)
-        allgroup.draw(screen)           
+        allgroup.draw(screen) # particles between the layers of the sprites
         pygame.display.flip()         
+    print(spritepool.stats())
 
 if __name__ == "__main__":
     game()
@@ -27,6 +27,9 @@ def game(folder = "data"):
     import os
     import random
     import math 
+    import rotocache # shared cache of rotated images
+    import spritepool # recycle fragments and smoke
+    import particles # smoke in numpy arrays, if numpy is installed
     #------ starting pygame -------------
     pygame.mixer.pre_init(44100, -16, 2, 2048) # setup mixer to avoid sound lag
     pygame.init()
@@ -219,6 +222,7 @@ def game(folder = "data"):
             self.image0 = Bird.image[0]
             #self.big = 2 # smallsprites have the value 0 for this attribute (.big) -> important for Bird.image
             Bird.__init__(self,5) # create a "little" Bird but do more than that
+            self.mask = rotocache.mask(self.image0, 0, smooth=False) # collide_mask before the first update
             self.hitpoints = float(100)
             self.hitpointsfull = float(100)
             self.pos = [screen.get_width()/2, screen.get_height()/2]
@@ -288,7 +292,8 @@ def game(folder = "data"):
             if pressedkeys[pygame.K_d]: # right turn, clockwise
                 self.angle -= self.rotatespeed
             self.oldcenter = self.rect.center
-            self.image = pygame.transform.rotate(self.image0, self.angle)
+            self.image = rotocache.rotate(self.image0, self.angle)
+            self.mask = rotocache.mask(self.image0, self.angle, smooth=False) # for collide_mask
             self.rect = self.image.get_rect()
             self.rect.center = self.oldcenter
             #--- calculate new position on screen -----
@@ -300,6 +305,7 @@ def game(folder = "data"):
     class Fragment(pygame.sprite.Sprite):
         """generic Fragment class. Inherits to blue Fragment (implosion),
            red Fragment (explosion), smoke (black) and shots (purple)"""
+        recycled = False # only sprites of a spritepool.Pooled class are recycled
         def __init__(self, pos, layer = 9):
             self._layer = layer
             pygame.sprite.Sprite.__init__(self, self.groups)
@@ -307,10 +313,13 @@ def game(folder = "data"):
             self.fragmentmaxspeed = FRAGMENTMAXSPEED# try out other factors !
 
         def init2(self):  # split the init method into 2 parts for better access from subclasses
-            self.image = pygame.Surface((10,10))
-            self.image.set_colorkey((0,0,0)) # black transparent
+            if self.recycled: # sprite from the pool: paint its old Surface again
+                self.image.fill((0,0,0,0)) # transparent
+            else:
+                self.image = pygame.Surface((10,10))
+                self.image.set_colorkey((0,0,0)) # black transparent
+                self.image = self.image.convert_alpha()
             pygame.draw.circle(self.image, self.color, (5,5), random.randint(2,5))
-            self.image = self.image.convert_alpha()
             self.rect = self.image.get_rect()
             self.rect.center = self.pos #if you forget this line the sprite sit in the topleft corner
             self.time = 0.0
@@ -324,7 +333,7 @@ def game(folder = "data"):
             self.rect.centerx = round(self.pos[0],0)
             self.rect.centery = round(self.pos[1],0)
     
-    class RedFragment(Fragment):
+    class RedFragment(spritepool.Pooled, Fragment):
         """explodes outward from (killed) Bird"""
         def __init__(self,pos):
             self.groups = allgroup, stuffgroup, fragmentgroup, gravitygroup
@@ -340,7 +349,7 @@ def game(folder = "data"):
             self.mass = 48.0
             
    
-    class Smoke(Fragment):
+    class Smoke(spritepool.Pooled, Fragment):
         """black exhaust indicating that the BigBird sprite is moved by
            the player. Exhaust direction is inverse of players movement direction"""
         def __init__(self, pos, dx, dy):
@@ -357,8 +366,9 @@ def game(folder = "data"):
            self.dx = dx * self.smokespeed + random.random()*2*arc - arc
            self.dy = dy * self.smokespeed + random.random()*2*arc - arc
            
-    class Wound(Fragment):
+    class Wound(spritepool.Pooled, Fragment):
         """yellow impact wound that shows the exact location of the hit"""
+        references = ("victim",) # spritepool: forget the victim when the wound is killed
         def __init__(self, pos, victim):
             self.color = ( random.randint(200,255), random.randint(200,255), random.randint(0,50))
             self.groups = allgroup, stuffgroup
@@ -377,6 +387,7 @@ def game(folder = "data"):
     class Bullet(Fragment):
         """a bullet flying in the direction of the BigBird's heading. May 
            be subject to gravity"""
+        image0 = None # the unrotated image, shared by all bullets
         def __init__(self, boss, dx, dy):
             self.color = (200,0,200)
             self.boss = boss
@@ -385,15 +396,15 @@ def game(folder = "data"):
             self.pos[0] = self.boss.pos[0]
             self.pos[1] = self.boss.pos[1]
             self.lifetime = 5 # 5 seconds
-            self.image = pygame.Surface((4,20))
-            self.image.set_colorkey((0,0,0)) # black transparent
-            pygame.draw.rect(self.image, self.color, (0,0,4,20) )
-            pygame.draw.rect(self.image, (10,0,0), (0,0,4,4)) # point
-            self.image = self.image.convert_alpha()
-            self.image0 = self.image.copy()
-            self.rect = self.image.get_rect()
-            self.rect.center = self.boss.rect.center
-            self.image = pygame.transform.rotate(self.image, self.boss.angle)
+            if Bullet.image0 is None: # drawn only once, all bullets share it
+                image = pygame.Surface((4,20))
+                image.set_colorkey((0,0,0)) # black transparent
+                pygame.draw.rect(image, self.color, (0,0,4,20) )
+                pygame.draw.rect(image, (10,0,0), (0,0,4,4)) # point
+                Bullet.image0 = image.convert_alpha()
+            self.image0 = Bullet.image0
+            self.image = rotocache.rotate(self.image0, self.boss.angle)
+            self.mask = rotocache.mask(self.image0, self.boss.angle, smooth=False) # for collide_mask
             self.rect = self.image.get_rect()
             self.rect.center = self.boss.rect.center
             self.time = 0.0
@@ -414,7 +425,8 @@ def game(folder = "data"):
                     self.angle = -90-math.atan(ratio)/math.pi*180.0 # in grad
                 else:
                     self.angle = 90-math.atan(ratio)/math.pi*180.0 # in grad
-            self.image = pygame.transform.rotozoom(self.image0,self.angle,1.0)
+            self.image = rotocache.rotozoom(self.image0,self.angle)
+            self.mask = rotocache.mask(self.image0,self.angle) # cached, not rebuilt by collide_mask
             
     # ----------------- end of definitions ------------  
     # ----------------- background artwork -------------  
@@ -436,7 +448,7 @@ def game(folder = "data"):
     fragmentgroup = pygame.sprite.Group()
     gravitygroup = pygame.sprite.Group()
     # only the allgroup draws the sprite, so i use LayeredUpdates() instead Group()
-    allgroup = pygame.sprite.LayeredUpdates() # more sophisticated, can draw sprites in layers 
+    allgroup = particles.LayeredUpdates() # more sophisticated, can draw sprites in layers, and particles between them
 
     #-------------loading files from data subdirectory -------------------------------
     try: # load images into classes (class variable !). if not possible, draw ugly images
@@ -478,6 +490,12 @@ def game(folder = "data"):
     gametime = 60 # how long to play (seconds)
     playtime = 0  # how long the game was played
     gravity = True
+    # smoke becomes particles instead of sprites. Red fragments stay sprites:
+    # they hit the birds (fragmentgroup), particles can not collide
+    if particles.numpy is not None:
+        smoke = allgroup.addparticles(particles.ParticleSystem(), 3) # layer of the Smoke sprites
+        def Smoke(pos, dx, dy):
+            smoke.smoke(pos, dx, dy, lifetime = 1 + random.random()*2) # max 3 seconds, like the Smoke class
         
     while mainloop:
         milliseconds = clock.tick(FPS)  # milliseconds passed since last frame
@@ -570,10 +588,12 @@ def game(folder = "data"):
             screentext.newmsg("Time left: %.2f" % (gametime - playtime))
         
         # ----------- clear, draw , update, flip -----------------  
-        allgroup.clear(screen, background)
+        allgroup.clear(screen, background) # sprites and particles
+        allgroup.updateparticles(seconds) # smoke does not fall down
         allgroup.update(seconds)
-        allgroup.draw(screen)           
+        allgroup.draw(screen) # particles between the layers of the sprites
         pygame.display.flip()         
+    print(spritepool.stats())
 
 if __name__ == "__main__":
     game()
@@ -23,6 +23,10 @@ def game(folder = "data"):
     import os
     import random
     import math 
+    import rotocache # shared cache of rotated images
+    import spritepool # recycle fragments and smoke
+    import particles # smoke and fragments in numpy arrays, if numpy is installed
+    import spatialhash # grid for collision detection
     #------ starting pygame -------------
     pygame.mixer.pre_init(44100, -16, 2, 2048) # setup mixer to avoid sound lag
     pygame.init()
@@ -312,7 +316,8 @@ def game(folder = "data"):
             # --------- rotated ? -------------------
             if self.angle != self.oldangle:            
                 self.oldcenter = self.rect.center
-                self.image = pygame.transform.rotate(self.image0, self.angle)
+                self.image = rotocache.rotate(self.image0, self.angle)
+                self.mask = rotocache.mask(self.image0, self.angle, smooth=False) # for collide_mask
                 self.rect = self.image.get_rect()
                 self.rect.center = self.oldcenter
                 self.oldangle = self.angle
@@ -342,7 +347,7 @@ def game(folder = "data"):
             self.image = Player.image[self.playernumber] # start with 0
             self.image0 = Player.image[self.playernumber] # start with 0 
             self.rect = self.image.get_rect()
-            self.mask = pygame.mask.from_surface(self.image) # pixelmask ---- necessary ?
+            self.mask = rotocache.mask(self.image0, 0, smooth=False) # pixelmask, calculated once for all angles
             if self.playernumber == 0:
                 self.pos = [screen.get_width()/10*2,screen.get_height()-30]
                 self.angle = 270
@@ -512,6 +517,7 @@ def game(folder = "data"):
             self.rocket2color = (20,random.randint(200,255),80)
             self.rockets_hit = 0
             self.rect = self.image.get_rect()
+            self.mask = rotocache.mask(self.image, 0, smooth=False) # one cached mask per monster image
             self.pos = [0.0,0.0]
             self.pos[0] = pos[0]
             self.pos[1] = pos[1]
@@ -612,12 +618,14 @@ def game(folder = "data"):
                     self.firetime -= seconds    
                 else:
                     self.firetime = 0
+            self.mask = rotocache.mask(self.image, 0, smooth=False) # the image may have changed, collide_mask needs its mask
             GameObject.update(self, seconds)
             
             
     class Fragment(pygame.sprite.Sprite):
         """generic Fragment class. """
         number = 0
+        recycled = False # only sprites of a spritepool.Pooled class are recycled
         def __init__(self, pos, layer = 9):
             self._layer = layer
             pygame.sprite.Sprite.__init__(self, self.groups)
@@ -627,11 +635,14 @@ def game(folder = "data"):
             Fragment.number += 1
             
         def init2(self):  # split the init method into 2 parts for better access from subclasses
-            self.image = pygame.Surface((10,10))
-            self.image.set_colorkey((0,0,0)) # black transparent
+            if self.recycled: # sprite from the pool: paint its old Surface again
+                self.image.fill((0,0,0,0)) # transparent
+            else:
+                self.image = pygame.Surface((10,10))
+                self.image.set_colorkey((0,0,0)) # black transparent
+                self.image = self.image.convert_alpha()
             self.fragmentradius = random.randint(2,5)
             pygame.draw.circle(self.image, self.color, (5,5), self.fragmentradius)
-            self.image = self.image.convert_alpha()
             self.rect = self.image.get_rect()
             self.rect.center = self.pos #if you forget this line the sprite sit in the topleft corner
             self.time = 0.0
@@ -645,7 +656,7 @@ def game(folder = "data"):
             self.rect.centerx = round(self.pos[0],0)
             self.rect.centery = round(self.pos[1],0)
     
-    class RedFragment(Fragment):
+    class RedFragment(spritepool.Pooled, Fragment):
         """explodes outward from (killed) sprite"""
         def __init__(self,pos, stay = False):
             self.groups = allgroup, fragmentgroup, gravitygroup
@@ -664,7 +675,7 @@ def game(folder = "data"):
             self.init2() # continue with generic Fragment class
             self.mass = 48.0
             
-    class Wound(Fragment):
+    class Wound(spritepool.Pooled, Fragment):
         """yellow impact wound that shows the exact location of the hit"""
         def __init__(self, pos, greenmin = 200, greenmax = 255 ):
             self.greenmin = greenmin
@@ -681,11 +692,10 @@ def game(folder = "data"):
         
         def update(self,time):
             self.color = ( random.randint(200,255), random.randint(self.greenmin,self.greenmax), random.randint(0,50))
-            pygame.draw.circle(self.image, self.color, (5,5), self.fragmentradius)
-            self.image = self.image.convert_alpha()
+            pygame.draw.circle(self.image, self.color, (5,5), self.fragmentradius) # no new Surface each frame
             Fragment.update(self, time)
             
-    class Smoke(Fragment):
+    class Smoke(spritepool.Pooled, Fragment):
         """black exhaust indicating that the sprite is moved.
            Exhaust direction is inverse of players movement direction"""
         def __init__(self, pos, dx, dy, colmin=1, colmax=50):
@@ -717,12 +727,9 @@ def game(folder = "data"):
             self.color = self.boss.bulletcolor
             self.groups = allgroup, bulletgroup, gravitygroup,projectilegroup
             self.lifetime = self.boss.bulletlifetime 
-            self.image = pygame.Surface((4,20))
-            self.image.set_colorkey((0,0,0)) # black transparent
-            pygame.draw.rect(self.image, self.color, (0,0,4,20) )
-            pygame.draw.rect(self.image, (10,0,0), (0,0,4,4)) # point
-            self.image = self.image.convert_alpha()
-            self.image0 = self.image.copy()
+            self.image0 = Bullet.draw(self.color) # shared by all bullets of this color
+            self.image = self.image0
+            self.mask = rotocache.mask(self.image0, 0, smooth=False)
             self.rect = self.image.get_rect()
             self.pos = self.boss.pos[:]
             self.rect.centerx = round(self.pos[0],0)
@@ -735,6 +742,17 @@ def game(folder = "data"):
             self.hitpoints = 3
             self.mass = 50
             self.radius = self.rect.width / 2.0
+
+        images = {} # color: image, drawn only once so that the rotation cache can find it
+        @staticmethod
+        def draw(color):
+            if color not in Bullet.images:
+                image = pygame.Surface((4,20))
+                image.set_colorkey((0,0,0)) # black transparent
+                pygame.draw.rect(image, color, (0,0,4,20) )
+                pygame.draw.rect(image, (10,0,0), (0,0,4,4)) # point
+                Bullet.images[color] = image.convert_alpha()
+            return Bullet.images[color]
             
         def update(self, seconds):
             self.angle = GameObject.rotate_toward_moving(self)
@@ -773,12 +791,9 @@ def game(folder = "data"):
             self.target = GameObject.gameobjects[targetnr] # player ?
             self.type = type
             #---------- image --------------
-            self.image = pygame.Surface((self.size,20))
-            self.image.set_colorkey((0,0,0)) # black transparent
-            pygame.draw.rect(self.image, self.color, (0,0,self.size,20) )
-            pygame.draw.rect(self.image, (10,0,0), (0,0,self.size,4)) # point
-            self.image = self.image.convert_alpha()
-            self.image0 = self.image.copy()
+            self.image0 = Rocket.draw(self.size, self.color) # shared by all rockets of this type and color
+            self.image = self.image0
+            self.mask = rotocache.mask(self.image0, 0, smooth=False)
             self.rect = self.image.get_rect()
             self.angle = launchangle + self.boss.angle
             self.groups = allgroup, rocketgroup, projectilegroup
@@ -793,6 +808,17 @@ def game(folder = "data"):
             self.radius = self.rect.width / 2.0
             self.frags = 5
             self.smokechance = 3 # probability of 1:5 for each frame to launch Smoke
+
+        images = {} # (size, color): image
+        @staticmethod
+        def draw(size, color):
+            if (size, color) not in Rocket.images:
+                image = pygame.Surface((size,20))
+                image.set_colorkey((0,0,0)) # black transparent
+                pygame.draw.rect(image, color, (0,0,size,20) )
+                pygame.draw.rect(image, (10,0,0), (0,0,size,4)) # point
+                Rocket.images[(size, color)] = image.convert_alpha()
+            return Rocket.images[(size, color)]
             
         def kill(self):
             #for _ in range(self.frags):
@@ -833,7 +859,8 @@ def game(folder = "data"):
             #----------- both ------------
             GameObject.speedcheck(self)
             oldrect = self.rect.center
-            self.image = pygame.transform.rotozoom(self.image0,self.angle,1.0) 
+            self.image = rotocache.rotozoom(self.image0,self.angle) # one dict lookup instead of a resample
+            self.mask = rotocache.mask(self.image0,self.angle) # and no from_surface in collide_mask
             self.rect = self.image.get_rect()   
             self.rect.center = oldrect
             self.pos[0] += self.dx * seconds
@@ -859,7 +886,7 @@ def game(folder = "data"):
     gravitygroup = pygame.sprite.Group()
     projectilegroup = pygame.sprite.Group()
     # only the allgroup draws the sprite, so i use LayeredUpdates() instead Group()
-    allgroup = pygame.sprite.LayeredUpdates() # more sophisticated, can draw sprites in layers 
+    allgroup = particles.LayeredUpdates() # more sophisticated, can draw sprites in layers, and particles between them
 
     #-------------loading files from data subdirectory -------------------------------
     try:
@@ -879,6 +906,9 @@ def game(folder = "data"):
         impactsound = pygame.mixer.Sound(os.path.join(folder,'explode.ogg'))
     except:
         raise(UserWarning, "Sadly i could not loading all graphic or sound files from %s" % folder)
+    # ------- rotate the player images and their masks into all directions now, not during the game -----
+    for image in Player.image:
+        rotocache.prewarm(image, smooth=False, masks=True)
     
     # ------------- before the main loop ----------------------
     screentext1 = Text("first line", (255,0,255),(0,0))
@@ -898,6 +928,13 @@ def game(folder = "data"):
     gametime = 360 # how long to play (seconds)
     playtime = 0  # how long the game was played
     gravity = False # gravity can be toggled
+    projectilegrid = spatialhash.SpatialHash() # bullets and rockets, sorted into grid cells each frame
+    if particles.numpy is not None: # smoke and red fragments become particles instead of sprites
+        smoke = allgroup.addparticles(particles.ParticleSystem(), 3) # layer of the Smoke sprites
+        sparks = allgroup.addparticles(particles.ParticleSystem(), 9) # layer of the RedFragment sprites
+        Smoke = smoke.smoke # same arguments as the Smoke class: pos, dx, dy, colmin, colmax
+        def RedFragment(pos, stay=False):
+            sparks.fragments(pos, 1, stay)
     
         
     while mainloop:
@@ -928,8 +965,9 @@ def game(folder = "data"):
         else:
             Player.duel = False
             
+        projectilegrid.build(projectilegroup) # only projectiles in the same cells are tested against each other
         for player in playergroup:  # test if a player crash into enemy bullet ... vamipr health stealing effect !
-            crashgroup = pygame.sprite.spritecollide(player, bulletgroup, False, pygame.sprite.collide_mask)
+            crashgroup = projectilegrid.spritecollide(player, bulletgroup, False, pygame.sprite.collide_mask)
             for bullet in crashgroup: # this include friendly fire
                 if bullet.boss.playernumber != player.playernumber: # only care for unfriendly fire
                     if bullet.boss.number < 2:
@@ -949,7 +987,7 @@ def game(folder = "data"):
                 # no damage ?
         
             # test if player crash into enemy rocket
-            crashgroup = pygame.sprite.spritecollide(player, rocketgroup, False, pygame.sprite.collide_mask)
+            crashgroup = projectilegrid.spritecollide(player, rocketgroup, False, pygame.sprite.collide_mask)
             for rocket in crashgroup:
                 #if projectile.physicnumber > crashbody.physicnumber: #avoid checking twice
                 if rocket.boss.playernumber != player.playernumber: # avoid friendly fire
@@ -960,15 +998,14 @@ def game(folder = "data"):
                    elastic_collision(rocket, player)
                    rocket.kill()
         
-        for projectile in projectilegroup:
-            # rocket vs rocket vs bullet vs bullet
-            crashgroup = pygame.sprite.spritecollide(projectile, projectilegroup, False )
-            for crashthing in crashgroup:
-                if projectile.number > crashthing.number:
-                    if crashthing.boss.playernumber != projectile.boss.playernumber:
-                        projectile.hitpoints -= crashthing.damage
-                        crashthing.hitpoints -= projectile.damage
-                        elastic_collision(projectile, crashthing)
+        for projectile, crashthing in projectilegrid.pairs():
+            # rocket vs rocket vs bullet vs bullet, every touching pair only once
+            if projectile.number < crashthing.number:
+                projectile, crashthing = crashthing, projectile # higher number first, as before
+            if crashthing.boss.playernumber != projectile.boss.playernumber:
+                projectile.hitpoints -= crashthing.damage
+                crashthing.hitpoints -= projectile.damage
+                elastic_collision(projectile, crashthing)
             
         if gravity: # ---- gravity check ---
             for thing in gravitygroup:  # gravity suck down bullets, players, monsters
@@ -1020,10 +1057,13 @@ def game(folder = "data"):
                                player2.rockets_fired, player2.rockets_hit, player2.rockets_hit * 100.0 / max(1,player2.rockets_fired))
                                ,(0,0,255))
         # ----------- clear, draw , update, flip -----------------  
-        allgroup.clear(screen, background)
+        allgroup.clear(screen, background) # sprites and particles
+        allgroup.updateparticles(seconds, 2.81 if gravity else 0) # gravity like for the gravitygroup
         allgroup.update(seconds)
-        allgroup.draw(screen)           
+        allgroup.draw(screen) # particles between the layers of the sprites
         pygame.display.flip()         
+    print(rotocache.CACHE.stats())
+    print(spritepool.stats())
 
 if __name__ == "__main__":
     game()
@@ -17,6 +17,7 @@ special thanks to Jonathan Persson for motivation to write this
 import pygame
 import random
 import math
+import rotocache # shared cache of rotated images
 GRAD = math.pi / 180 # 2 * pi / 360   # math module needs Radiant instead of Grad
 
 class Config(object):
@@ -290,7 +291,7 @@ class Tank(pygame.sprite.Sprite):
         # angle etc from Tank (boss)
         oldcenter = self.rect.center
         oldrect = self.image.get_rect() # store current surface rect
-        self.image  = pygame.transform.rotate(self.image0, self.tankAngle) 
+        self.image  = rotocache.rotate(self.image0, self.tankAngle) 
         self.rect = self.image.get_rect()
         self.rect.center = oldcenter 
         # if tank is rotating, turret is also rotating with tank !
@@ -395,7 +396,7 @@ class Turret(pygame.sprite.Sprite):
         # --------- rotating -------------
         # angle etc from Tank (boss)
         oldrect = self.image.get_rect() # store current surface rect
-        self.image  = pygame.transform.rotate(self.image, self.boss.turretAngle) 
+        self.image  = rotocache.rotate(self.image, self.boss.turretAngle) # self.image is one of self.images
         self.rect = self.image.get_rect()
         # ---------- move with boss ---------
         self.rect = self.image.get_rect()
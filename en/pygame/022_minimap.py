@@ -19,6 +19,7 @@ from __future__ import print_function, division
 import pygame
 import random
 import math
+import rotocache # shared cache of rotated images
 GRAD = math.pi / 180 # 2 * pi / 360   # math module needs Radiant instead of Grad
 
 class Config(object):
@@ -350,7 +351,7 @@ class Tank(pygame.sprite.Sprite):
         # angle etc from Tank (boss)
         oldcenter = self.rect.center
         oldrect = self.image.get_rect() # store current surface rect
-        self.image  = pygame.transform.rotate(self.image0, self.tankAngle) 
+        self.image  = rotocache.rotate(self.image0, self.tankAngle) 
         self.rect = self.image.get_rect()
         self.rect.center = oldcenter 
         # if tank is rotating, turret is also rotating with tank !
@@ -460,7 +461,7 @@ class Turret(pygame.sprite.Sprite):
         # --------- rotating -------------
         # angle etc from Tank (boss)
         oldrect = self.image.get_rect() # store current surface rect
-        self.image  = pygame.transform.rotate(self.image, self.boss.turretAngle) 
+        self.image  = rotocache.rotate(self.image, self.boss.turretAngle) # self.image is one of self.images
         self.rect = self.image.get_rect()
         # ---------- move with boss ---------
         self.rect = self.image.get_rect()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+023_dirtyLayeredSprites.py
+LayeredDirty sprite group and DirtySprites: only redraw what has changed
+url: http://thepythongamebook.com/en:part2:pygame:step023
+licence: gpl, see http://www.gnu.org/licenses/gpl.html
+
+Until now, every game loop ended like 019_homing_missiles.py:
+    allgroup.clear(screen, background)
+    allgroup.update(seconds)
+    allgroup.draw(screen)
+    pygame.display.flip()
+flip() copies the whole screen into the window, every frame, even if only
+a few small sprites have moved.
+
+This example uses a pygame.sprite.LayeredDirty group with DirtySprites
+instead. A DirtySprite with dirty = 1 is drawn once, then its dirty is set
+back to 0 and the sprite is not drawn again until it changes. The draw()
+method of the group returns the rects that have changed, and
+pygame.display.update(rects) copies only those rects into the window.
+dirtyrects.DirtyScreen merges the rects and falls back to flip() when most
+of the screen has changed anyway.
+
+The same sprites can be drawn both ways, press f to switch and compare the
+frames per second of both ways in the window title.
+
+keys: f = switch between flip (like 019) and dirty rects
+      + and - = more or less moving balls
+      ESC = quit
+
+python 023_dirtyLayeredSprites.py benchmark
+    runs both ways for a few seconds with different numbers of moving
+    balls and prints the frames per second of each
+
+works with python3.4 and python2.7
+"""
+
+#the next line is only needed for python2.x and not necessary for python3.x
+from __future__ import print_function, division
+import random
+import sys
+import pygame
+import dirtyrects
+
+WIDTH = 1024
+HEIGHT = 600
+BLOCKS = 300 # sprites that never move
+BALLS = 20   # sprites that move all the time
+
+def write(msg="pygame is cool", color=(0,0,0), size=24):
+    """write text into pygame surfaces"""
+    myfont = pygame.font.SysFont("None", size)
+    mytext = myfont.render(msg, True, color)
+    mytext = mytext.convert_alpha()
+    return mytext
+
+class Block(pygame.sprite.DirtySprite):
+    """a sprite that does not move. It is drawn once (dirty = 1) and then never
+       again, except if a moving sprite passes over it: LayeredDirty repaints it then"""
+    def __init__(self, pos):
+        pygame.sprite.DirtySprite.__init__(self)
+        self._layer = 1
+        self.image = pygame.Surface((24,24))
+        self.image.fill((random.randint(100,255), random.randint(100,255), random.randint(0,50)))
+        pygame.draw.rect(self.image, (0,0,0), (0,0,24,24), 1) # black border
+        self.image = self.image.convert()
+        self.rect = self.image.get_rect()
+        self.rect.center = pos
+        self.dirty = 1 # draw once
+
+class Ball(pygame.sprite.DirtySprite):
+    """a sprite that bounces around, it must be drawn again each time it moves"""
+    def __init__(self):
+        pygame.sprite.DirtySprite.__init__(self)
+        self._layer = 2
+        self.radius = random.randint(5,15)
+        self.image = pygame.Surface((self.radius * 2, self.radius * 2))
+        self.image.set_colorkey((0,0,0)) # black transparent
+        pygame.draw.circle(self.image, (random.randint(0,100), random.randint(0,100), random.randint(150,255)),
+                           (self.radius, self.radius), self.radius)
+        self.image = self.image.convert_alpha()
+        self.rect = self.image.get_rect()
+        self.pos = [random.randint(self.radius, WIDTH - self.radius), random.randint(self.radius, HEIGHT - self.radius)]
+        self.dx = random.choice((-1,1)) * random.randint(50,200)
+        self.dy = random.choice((-1,1)) * random.randint(50,200)
+        self.update(0.0)
+
+    def update(self, seconds):
+        self.pos[0] += self.dx * seconds
+        self.pos[1] += self.dy * seconds
+        if self.pos[0] < self.radius or self.pos[0] > WIDTH - self.radius: # bounce off left or right wall
+            self.dx *= -1
+            self.pos[0] = max(self.radius, min(WIDTH - self.radius, self.pos[0]))
+        if self.pos[1] < self.radius or self.pos[1] > HEIGHT - self.radius: # bounce off top or bottom
+            self.dy *= -1
+            self.pos[1] = max(self.radius, min(HEIGHT - self.radius, self.pos[1]))
+        self.rect.center = (round(self.pos[0], 0), round(self.pos[1], 0))
+        self.dirty = 1 # moved: draw again. LayeredDirty also repaints the old place
+
+class Text(pygame.sprite.DirtySprite):
+    """a text that is only drawn again when it changes"""
+    def __init__(self, pos):
+        pygame.sprite.DirtySprite.__init__(self)
+        self._layer = 3
+        self.pos = pos
+        self.msg = None
+        self.newmsg("")
+
+    def newmsg(self, msg):
+        if msg != self.msg:
+            self.msg = msg
+            self.image = write(msg)
+            self.rect = self.image.get_rect()
+            self.rect.topleft = self.pos
+            self.dirty = 1
+
+def make_background():
+    background = pygame.Surface((WIDTH, HEIGHT))
+    background.fill((255,255,255)) # fill white
+    for x in range(0, WIDTH, 32): # light grey grid, so that you can see what is repainted
+        pygame.draw.line(background, (220,220,220), (x,0), (x,HEIGHT))
+    for y in range(0, HEIGHT, 32):
+        pygame.draw.line(background, (220,220,220), (0,y), (WIDTH,y))
+    background.blit(write("f: flip or dirty rects  +/-: more or less balls  ESC: quit", (130,130,130)), (10, HEIGHT - 25))
+    return background.convert()
+
+def run(mode="dirty", balls=BALLS, seconds=None, fps=60):
+    """mode "dirty": LayeredDirty and display.update(rects), mode "flip": LayeredUpdates
+       and flip(), like 019_homing_missiles.py. Runs until ESC or for seconds.
+       returns the average frames per second of both modes (None if not used)"""
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    background = make_background()
+    screen.blit(background, (0,0))
+    random.seed(23) # the same sprites for both modes
+    sprites = [Block((random.randint(0, WIDTH), random.randint(0, HEIGHT))) for _ in range(BLOCKS)]
+    sprites.extend(Ball() for _ in range(balls))
+    text = Text((10,10))
+    sprites.append(text)
+    allgroup = None
+    dirtyscreen = None
+    clock = pygame.time.Clock()
+    frames = {"flip": 0, "dirty": 0}
+    playtime = {"flip": 0.0, "dirty": 0.0}
+    switch = True # create the group for mode
+    time = 0.0
+    mainloop = True
+    while mainloop:
+        if switch: # ----- same sprites, other group -----
+            switch = False
+            if allgroup is not None:
+                allgroup.empty() # the sprites stay, only the old group is gone
+            screen.blit(background, (0,0))
+            if mode == "dirty":
+                allgroup = pygame.sprite.LayeredDirty(*sprites)
+                dirtyscreen = dirtyrects.DirtyScreen(screen, background, allgroup)
+                dirtyscreen.repaint()
+            else:
+                allgroup = pygame.sprite.LayeredUpdates(*sprites)
+        milliseconds = clock.tick(fps) # fps = 0: as fast as possible
+        seconds_passed = milliseconds / 1000.0
+        time += seconds_passed
+        playtime[mode] += seconds_passed
+        frames[mode] += 1
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                mainloop = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    mainloop = False
+                elif event.key == pygame.K_f:
+                    mode = "flip" if mode == "dirty" else "dirty"
+                    switch = True
+                elif event.key in (pygame.K_PLUS, pygame.K_KP_PLUS, pygame.K_EQUALS):
+                    for _ in range(10):
+                        ball = Ball()
+                        sprites.append(ball)
+                        allgroup.add(ball)
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    for ball in [s for s in sprites if isinstance(s, Ball)][:10]:
+                        sprites.remove(ball)
+                        ball.kill() # LayeredDirty repaints the background where it was
+        if seconds is not None and time > seconds:
+            mainloop = False
+        text.newmsg("%s: %.0f fps, %i balls" % (mode, clock.get_fps(), len(sprites) - BLOCKS - 1))
+        pygame.display.set_caption("flip: %s fps   dirty: %s fps" % tuple(
+            "%.0f" % (frames[m] / playtime[m]) if playtime[m] else "-" for m in ("flip", "dirty")))
+        # ----------- clear, draw , update, flip -----------------
+        if mode == "dirty":
+            allgroup.update(seconds_passed)
+            dirtyscreen.draw() # update(rects) or flip()
+        else: # like 019_homing_missiles.py
+            allgroup.clear(screen, background)
+            allgroup.update(seconds_passed)
+            allgroup.draw(screen)
+            pygame.display.flip()
+    if dirtyscreen is not None:
+        print(dirtyscreen.stats())
+    return tuple(frames[m] / playtime[m] if playtime[m] else None for m in ("flip", "dirty"))
+
+def benchmark(seconds=3.0, counts=(0, 10, 50, 200, 1000)):
+    """both modes, as fast as possible, with more and more moving balls"""
+    print("balls   flip fps   dirty fps")
+    for balls in counts:
+        flip = run("flip", balls, seconds, 0)[0]
+        dirty = run("dirty", balls, seconds, 0)[1]
+        print("%5i   %8.0f   %9.0f" % (balls, flip, dirty))
+    pygame.quit()
+
+if __name__ == "__main__":
+    if "benchmark" in sys.argv[1:]:
+        benchmark()
+    else:
+        run()
+        pygame.quit()
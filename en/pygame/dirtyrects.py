@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+dirtyrects.py
+update only the changed parts of the screen (dirty rectangles) instead of flip()
+url: http://thepythongamebook.com/en:part2:pygame:step023
+licence: gpl, see http://www.gnu.org/licenses/gpl.html
+
+pygame.display.flip() copies the whole screen to the window, every frame.
+If only a few small sprites move, pygame.display.update(rects) copies only
+the rects that changed. A pygame.sprite.LayeredDirty group returns exactly
+those rects from its draw() method: the old and the new place of every
+DirtySprite with dirty = 1 (or 2).
+
+DirtyScreen does the rest:
+  * rects that overlap or nearly touch are merged into one, so update()
+    gets a few bigger rects instead of hundreds of small ones
+  * if the merged rects cover more than THRESHOLD of the screen, a full
+    flip() is faster than updating them one by one, and flip() is used
+
+    import dirtyrects
+    dirtyscreen = dirtyrects.DirtyScreen(screen, background)  # before the mainloop
+    dirtyscreen.group.add(sprite)        # DirtySprites only !
+    # in the mainloop, instead of clear, draw and flip:
+    dirtyscreen.group.update(seconds)
+    dirtyscreen.draw()
+    print(dirtyscreen.stats())
+
+works with python3.4 and python2.7
+"""
+
+#the next line is only needed for python2.x and not necessary for python3.x
+from __future__ import print_function, division
+import pygame
+
+THRESHOLD = 0.4 # more than 40% of the screen changed: flip() instead of update(rects)
+MARGIN = 4      # rects closer than MARGIN pixel are merged
+
+def merge(rects, margin=MARGIN):
+    """returns a list of rects that covers all rects, where overlapping or
+       nearly touching rects are joined into one bigger rect"""
+    merged = []
+    for rect in sorted(rects, key=lambda r: (r[0], r[1])): # left to right
+        rect = pygame.Rect(rect)
+        i = rect.inflate(margin * 2, margin * 2).collidelist(merged)
+        while i != -1: # the union can touch more rects, so join until it touches none
+            rect.union_ip(merged.pop(i))
+            i = rect.inflate(margin * 2, margin * 2).collidelist(merged)
+        merged.append(rect)
+    return merged
+
+class DirtyScreen(object):
+    """draws a LayeredDirty group and updates only the changed parts of the display"""
+    def __init__(self, screen, background, group=None, threshold=THRESHOLD, margin=MARGIN):
+        self.screen = screen
+        self.background = background
+        self.group = group if group is not None else pygame.sprite.LayeredDirty()
+        self.group.clear(screen, background) # the group paints the background over old sprite places
+        self.threshold = threshold
+        self.margin = margin
+        self.full = True  # next frame: update the whole screen
+        self.frames = 0
+        self.flips = 0    # frames with a full flip()
+        self.rects = 0    # rects given to display.update()
+        self.pixels = 0   # pixels copied to the window
+
+    def repaint(self):
+        """paint everything new at the next draw(), for example after the background changed"""
+        self.screen.blit(self.background, (0, 0))
+        for sprite in self.group:
+            if sprite.dirty == 0:
+                sprite.dirty = 1
+        self.full = True
+
+    def draw(self):
+        """draws the dirty sprites and brings the changed parts to the window.
+           returns the rects that were updated (or the screen rect after a flip)"""
+        return self.update(self.group.draw(self.screen))
+
+    def update(self, rects):
+        self.frames += 1
+        screenrect = self.screen.get_rect()
+        merged = [rect.clip(screenrect) for rect in merge(rects, self.margin)]
+        merged = [rect for rect in merged if rect.width and rect.height] # not outside of the screen
+        area = sum(rect.width * rect.height for rect in merged)
+        if self.full or area > self.threshold * screenrect.width * screenrect.height:
+            pygame.display.flip()
+            self.flips += 1
+            self.pixels += screenrect.width * screenrect.height
+            self.full = False
+            return [screenrect]
+        if merged:
+            pygame.display.update(merged)
+        self.rects += len(merged)
+        self.pixels += area
+        return merged
+
+    def stats(self):
+        if self.frames == 0:
+            return "dirty screen: no frames drawn"
+        screenrect = self.screen.get_rect()
+        return "dirty screen: %i frames, %i flips, %.1f rects per frame, %.1f%% of the screen updated per frame" % (
+            self.frames, self.flips, self.rects / self.frames,
+            100.0 * self.pixels / self.frames / (screenrect.width * screenrect.height))
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+particles.py
+many thousand particles (smoke, fragments, sparks) in numpy arrays instead of sprites
+url: http://thepythongamebook.com/en:part2:pygame:step019
+licence: gpl, see http://www.gnu.org/licenses/gpl.html
+
+Every Fragment or Smoke sprite has its own update() call, its own Surface
+and is drawn with its own blit. A few hundred of them slow the game down.
+
+A ParticleSystem stores position, speed, age, lifetime, color and size of
+all particles in numpy arrays. update() moves all of them with a few array
+operations, draw() writes all their pixels into the screen at once with
+pygame.surfarray, and clear() paints the background over the pixels of the
+last frame, like Group.clear() and Group.draw().
+
+The particles should be drawn at the layer of the sprites they replace
+(smoke behind the players). particles.LayeredUpdates is a
+pygame.sprite.LayeredUpdates that draws its particle systems between the
+layers of its sprites, and clears them together with the sprites:
+
+    import particles
+    allgroup = particles.LayeredUpdates()            # instead of pygame.sprite.LayeredUpdates()
+    smoke = allgroup.addparticles(particles.ParticleSystem(), 3)      # drawn after the sprites of layer 3
+    sparks = allgroup.addparticles(particles.ParticleSystem(), 9)
+    smoke.smoke(pos, dx, dy)                         # like Smoke(pos, dx, dy)
+    sparks.fragments(pos, 20)                        # like 20 times RedFragment(pos)
+    # in the mainloop:
+    allgroup.clear(screen, background)               # sprites and particles
+    allgroup.update(seconds)
+    allgroup.updateparticles(seconds, 2.81 if gravity else 0)  # gravity: pixel per second, added each frame
+    allgroup.draw(screen)                            # sprites and particles, layer by layer
+
+numpy is not installed everywhere. Without numpy, particles.numpy is None
+and the games keep their Fragment and Smoke sprites.
+
+works with python3.4 and python2.7
+"""
+
+#the next line is only needed for python2.x and not necessary for python3.x
+from __future__ import print_function, division
+import random
+import pygame
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+MAXPARTICLES = 50000 # more particles are not created
+MAXSIZE = 5          # particles are squares of 1 to MAXSIZE pixel
+
+class ParticleSystem(object):
+    """all particles of a game, stored in numpy arrays"""
+    def __init__(self, capacity=MAXPARTICLES):
+        self.capacity = capacity
+        self.count = 0  # the first count entries of each array are alive particles
+        self.pos = numpy.zeros((capacity, 2))
+        self.vel = numpy.zeros((capacity, 2))
+        self.age = numpy.zeros(capacity)
+        self.lifetime = numpy.ones(capacity)
+        self.color = numpy.zeros((capacity, 3), numpy.uint8)
+        self.size = numpy.ones(capacity, numpy.int32)
+        self.gravity = numpy.zeros(capacity, bool) # True: falls down if gravity is on
+        self.pending = [] # single particles, added to the arrays at the next update
+        self.drawn = None # (x, y) of all pixels drawn in the last frame, for clear()
+        self.lost = 0     # particles not created because capacity was full
+
+    def arrays(self):
+        return (self.pos, self.vel, self.age, self.lifetime, self.color, self.size, self.gravity)
+
+    def __len__(self):
+        return self.count + len(self.pending)
+
+    # ---------- creating particles ----------
+    def spawn(self, x, y, dx, dy, lifetime, color, size=1, gravity=False):
+        """one particle. cheap: only a list append, the arrays are changed once per frame"""
+        self.pending.append((x, y, dx, dy, lifetime, color[0], color[1], color[2], size, gravity))
+
+    def emit(self, count, pos, vel, lifetime, color, size=1, gravity=False):
+        """count particles at once. every argument is either one value for
+           all particles or an array with one value (or pair/color) per particle"""
+        free = self.capacity - self.count
+        if count > free:
+            self.lost += count - free
+            count = free
+        if count <= 0:
+            return
+        new = slice(self.count, self.count + count)
+        for array, value in zip(self.arrays(), (pos, vel, 0.0, lifetime, color, size, gravity)):
+            value = numpy.asarray(value)
+            if value.ndim == array.ndim: # one value per particle
+                value = value[:count]
+            array[new] = value
+        self.count += count
+
+    def flush(self):
+        """moves the pending single particles into the arrays"""
+        if not self.pending:
+            return
+        free = self.capacity - self.count
+        if len(self.pending) > free:
+            self.lost += len(self.pending) - free
+            del self.pending[free:]
+        if self.pending:
+            data = numpy.array(self.pending, float)
+            self.emit(len(data), data[:, 0:2], data[:, 2:4], data[:, 4], data[:, 5:8], data[:, 8], data[:, 9] > 0)
+        self.pending = []
+
+    def smoke(self, pos, dx, dy, colmin=1, colmax=50, lifetime=None):
+        """like Smoke(pos, dx, dy, colmin, colmax) in 019_homing_missiles.py"""
+        speed = 120.0 # how fast the smoke leaves the Bird
+        arc = speed * 0.3 # 0 = thin smoke stream, 1 = 180 Degrees
+        if lifetime is None:
+            lifetime = 0.25 + random.random() * 0.5
+        self.spawn(pos[0], pos[1],
+                   dx * speed + random.random() * 2 * arc - arc,
+                   dy * speed + random.random() * 2 * arc - arc,
+                   lifetime,
+                   (random.randint(colmin, colmax), random.randint(colmin, colmax), random.randint(colmin, colmax)),
+                   random.randint(2, 4))
+
+    def fragments(self, pos, count=1, stay=False, maxspeed=200, lifetime=0.5):
+        """count red fragments exploding from pos, like RedFragment(pos, stay). They fall down with gravity"""
+        if stay:
+            vel = 0.0
+        else:
+            vel = numpy.random.randint(-maxspeed, maxspeed + 1, (count, 2))
+        self.flush() # keep the order of creation
+        self.emit(count, pos, vel,
+                  lifetime + numpy.random.random(count),
+                  numpy.column_stack((numpy.random.randint(25, 256, count), numpy.zeros((count, 2), int))),
+                  numpy.random.randint(2, MAXSIZE + 1, count),
+                  True)
+
+    def implode(self, target, width, height, count=1, flytime=1.0):
+        """count blue fragments flying from the edges of a width x height screen to target
+           in flytime seconds, like BlueFragment(target) in 017_turning_and_physic.py"""
+        side = numpy.random.randint(1, 5, count) # 1 left, 2 top, 3 right, 4 bottom
+        x = numpy.random.randint(0, width + 1, count).astype(float)
+        y = numpy.random.randint(0, height + 1, count).astype(float)
+        x[side == 1] = 0
+        y[side == 2] = 0
+        x[side == 3] = width
+        y[side == 4] = height
+        pos = numpy.column_stack((x, y))
+        self.flush() # keep the order of creation
+        self.emit(count, pos, (numpy.asarray(target, float) - pos) / flytime,
+                  flytime + numpy.random.random(count) * 0.5, # a bit more lifetime after reaching the target
+                  numpy.column_stack((numpy.zeros((count, 2), int), numpy.random.randint(25, 256, count))),
+                  numpy.random.randint(2, MAXSIZE + 1, count))
+
+    # ---------- every frame ----------
+    def update(self, seconds, gravity=0.0):
+        """moves all particles and removes the old ones. gravity is added to
+           the vertical speed of falling particles, like thing.dy += 2.81"""
+        self.flush()
+        n = self.count
+        if n == 0:
+            return
+        self.age[:n] += seconds
+        if gravity:
+            self.vel[:n, 1][self.gravity[:n]] += gravity
+        self.pos[:n] += self.vel[:n] * seconds
+        alive = self.age[:n] < self.lifetime[:n]
+        if not alive.all(): # move the living particles to the front of the arrays
+            living = int(alive.sum())
+            for array in self.arrays():
+                array[:living] = array[:n][alive]
+            self.count = living
+
+    def pixels(self, width, height, colors):
+        """x, y and color of every pixel of every particle inside of width x height.
+           colors: one color value per particle"""
+        n = self.count
+        left = self.pos[:n, 0].astype(numpy.int32)
+        top = self.pos[:n, 1].astype(numpy.int32)
+        xs, ys, cs = [], [], []
+        for size in range(1, MAXSIZE + 1): # all particles of one size at once
+            same = self.size[:n] == size
+            if not same.any():
+                continue
+            offsets = numpy.arange(size) - size // 2
+            ox = numpy.tile(offsets, size)    # x offset of every pixel of a size x size square
+            oy = numpy.repeat(offsets, size)  # y offset
+            xs.append((left[same, None] + ox).ravel())
+            ys.append((top[same, None] + oy).ravel())
+            cs.append(numpy.repeat(colors[same], size * size, axis=0))
+        x, y, c = numpy.concatenate(xs), numpy.concatenate(ys), numpy.concatenate(cs)
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        return x[inside], y[inside], c[inside]
+
+    def colors(self, surface):
+        """the colors of all particles as pixel values of surface"""
+        n = self.count
+        if surface.get_bytesize() != 4:
+            return self.color[:n] # r, g, b for pixels3d
+        rgb = self.color[:n].astype(numpy.uint32)
+        shifts = surface.get_shifts()
+        losses = surface.get_losses()
+        colors = numpy.uint32(surface.get_masks()[3]) # opaque, if the surface has alpha
+        for i in range(3):
+            colors = colors | ((rgb[:, i] >> losses[i]) << shifts[i])
+        return colors
+
+    def surfacepixels(self, surface):
+        """numpy view of the pixels of surface, indexed [x, y] (locks surface until deleted).
+           32 bit surfaces: one integer per pixel (pixels2d), else r, g, b (pixels3d).
+           Works with subsurfaces and surfaces with padded rows, too"""
+        if surface.get_bytesize() == 4:
+            return pygame.surfarray.pixels2d(surface)
+        return pygame.surfarray.pixels3d(surface)
+
+    def draw(self, surface):
+        """writes all particles into surface in one go"""
+        if self.count == 0:
+            self.drawn = None
+            return
+        x, y, colors = self.pixels(surface.get_width(), surface.get_height(), self.colors(surface))
+        screenpixels = self.surfacepixels(surface)
+        screenpixels[x, y] = colors
+        del screenpixels
+        self.drawn = (x, y)
+
+    def clear(self, surface, background):
+        """paints background (at least as big as surface) over the particles of the last draw()"""
+        if self.drawn is None:
+            return
+        x, y = self.drawn
+        if surface.get_bitsize() == background.get_bitsize() and surface.get_shifts() == background.get_shifts():
+            screenpixels = self.surfacepixels(surface)
+            backgroundpixels = self.surfacepixels(background)
+        else: # background has another pixel format: copy r, g, b
+            screenpixels = pygame.surfarray.pixels3d(surface)
+            backgroundpixels = pygame.surfarray.pixels3d(background)
+        screenpixels[x, y] = backgroundpixels[x, y]
+        del screenpixels, backgroundpixels
+        self.drawn = None
+
+class LayeredUpdates(pygame.sprite.LayeredUpdates):
+    """pygame.sprite.LayeredUpdates that also draws and clears particle systems,
+       each one after the sprites of its layer. Works without numpy, too (without particles)"""
+    def __init__(self, *sprites, **kwargs):
+        pygame.sprite.LayeredUpdates.__init__(self, *sprites, **kwargs)
+        self.particles = [] # (layer, ParticleSystem), lowest layer first
+
+    def addparticles(self, system, layer):
+        """system is drawn after the sprites of layer and before the sprites of higher layers. returns system"""
+        self.particles.append((layer, system))
+        self.particles.sort(key=lambda item: item[0])
+        return system
+
+    def updateparticles(self, seconds, gravity=0.0):
+        for layer, system in self.particles:
+            system.update(seconds, gravity)
+
+    def clear(self, surface, bgd):
+        pygame.sprite.LayeredUpdates.clear(self, surface, bgd)
+        if not callable(bgd):
+            for layer, system in self.particles:
+                system.clear(surface, bgd)
+
+    def draw(self, surface):
+        """like LayeredUpdates.draw, returns its rects (the sprites only, not the particles).
+           only the public api of pygame.sprite: all sprites are drawn first, then every particle
+           system, and the sprites of higher layers are blitted again where they cover its particles"""
+        dirty = pygame.sprite.LayeredUpdates.draw(self, surface)
+        for layer, system in self.particles:
+            system.draw(surface)
+            if system.drawn is None:
+                continue
+            x, y = system.drawn
+            for sprite in self.sprites(): # lowest layer first
+                if self.get_layer_of_sprite(sprite) <= layer:
+                    continue
+                rect = sprite.rect
+                inside = (x >= rect.left) & (x < rect.right) & (y >= rect.top) & (y < rect.bottom)
+                if not inside.any():
+                    continue
+                left, top = int(x[inside].min()), int(y[inside].min())
+                area = pygame.Rect(left - rect.left, top - rect.top,
+                                   int(x[inside].max()) - left + 1, int(y[inside].max()) - top + 1)
+                surface.blit(sprite.image, (left, top), area) # only the part over the particles
+        return dirty
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+rotocache.py
+shared cache of rotated (and zoomed) images for pygame sprites
+url: http://thepythongamebook.com/en:part2:pygame:step019
+licence: gpl, see http://www.gnu.org/licenses/gpl.html
+
+pygame.transform.rotate and rotozoom resample the whole image each time
+they are called. A rocket that rotates every frame costs one resample per
+frame, hundreds of rockets cost hundreds of resamples per frame.
+Instead, the angle is rounded to a few degrees (STEP) and every rotated
+image is calculated only once and stored in a dictionary. The next sprite
+with the same source image and nearly the same angle gets the stored image.
+
+The cache forgets the least recently used images when all stored images
+together have more than MAXPIXELS pixels.
+
+Each rotated image can also have a collision mask (pygame.mask). Without a
+.mask attribute, pygame.sprite.collide_mask calls mask.from_surface for both
+sprites of every pair it tests, every frame. mask() calculates the mask of a
+rotated image only once and keeps it next to the image, so a sprite can set
+self.mask whenever it sets self.image.
+
+usage (the source image must stay the same Surface object, so share it
+between all sprites that look alike instead of drawing a new one for each):
+
+    import rotocache
+    rotocache.prewarm(Rocket.image0)   # optional: rotate all angles at load time
+    self.image = rotocache.rotozoom(self.image0, self.angle)   # instead of pygame.transform.rotozoom
+    self.image = rotocache.rotate(self.image0, self.angle)     # instead of pygame.transform.rotate
+    self.mask = rotocache.mask(self.image0, self.angle, smooth=False) # mask of the image above
+
+works with python3.4 and python2.7
+"""
+
+#the next line is only needed for python2.x and not necessary for python3.x
+from __future__ import print_function, division
+import collections
+import pygame
+
+STEP = 3                      # angles are rounded to multiples of STEP degrees
+MAXPIXELS = 4 * 1024 * 1024   # about 16 MB of 32-bit images
+
+class RotationCache(object):
+    """stores rotated images and their masks, keyed by (source image, rounded angle, scale, smooth)"""
+    def __init__(self, step=STEP, maxpixels=MAXPIXELS):
+        self.step = step
+        self.maxpixels = maxpixels
+        self.images = collections.OrderedDict() # key: [source, rotated image, mask], most recently used last
+        self.pixels = 0 # pixels of all stored images
+        self.hits = 0
+        self.misses = 0
+        self.masks = 0 # masks calculated
+
+    def quantize(self, angle):
+        """rounds angle to the nearest multiple of step, between 0 and 360"""
+        return int(round(angle / self.step)) * self.step % 360
+
+    def get(self, image, angle, scale=1.0, smooth=True):
+        """returns image rotated by angle (and zoomed by scale).
+           smooth=True works like pygame.transform.rotozoom, smooth=False like rotate"""
+        return self.entry(image, angle, scale, smooth)[1]
+
+    def mask(self, image, angle, scale=1.0, smooth=True):
+        """returns the mask of get(image, angle, scale, smooth), calculated only once"""
+        entry = self.entry(image, angle, scale, smooth)
+        if entry[2] is None:
+            entry[2] = pygame.mask.from_surface(entry[1])
+            self.masks += 1
+        return entry[2]
+
+    def entry(self, image, angle, scale, smooth):
+        key = (id(image), self.quantize(angle), scale, smooth)
+        try:
+            entry = self.images.pop(key)
+        except KeyError:
+            entry = [image, self.transform(image, self.quantize(angle), scale, smooth), None]
+            self.misses += 1
+            self.pixels += self.size(entry[1])
+            while self.pixels > self.maxpixels and self.images:
+                oldkey, oldentry = self.images.popitem(last=False) # least recently used
+                self.pixels -= self.size(oldentry[1])
+        else:
+            self.hits += 1
+        # the entry keeps a reference to the source image, so its id() can not be
+        # reused by another Surface while the entry is in the cache
+        self.images[key] = entry
+        return entry
+
+    def transform(self, image, angle, scale, smooth):
+        if smooth:
+            return pygame.transform.rotozoom(image, angle, scale)
+        rotated = pygame.transform.rotate(image, angle)
+        if scale != 1.0:
+            w, h = rotated.get_size()
+            rotated = pygame.transform.scale(rotated, (int(w * scale), int(h * scale)))
+        return rotated
+
+    def size(self, image):
+        w, h = image.get_size()
+        return w * h
+
+    def prewarm(self, image, scale=1.0, smooth=True, masks=False):
+        """calculates all angles of image (and their masks) at once, for example at load time"""
+        for angle in range(0, 360, self.step):
+            if masks:
+                self.mask(image, angle, scale, smooth)
+            else:
+                self.get(image, angle, scale, smooth)
+
+    def clear(self):
+        self.images.clear()
+        self.pixels = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return "rotation cache: %i images, %i pixels, %i hits, %i misses (%.1f%% hits), %i masks calculated" % (
+            len(self.images), self.pixels, self.hits, self.misses, 100.0 * self.hits / total if total else 0.0,
+            self.masks)
+
+# ----- one cache shared by all sprites -----
+CACHE = RotationCache()
+
+def rotozoom(image, angle, scale=1.0):
+    """like pygame.transform.rotozoom, but cached"""
+    return CACHE.get(image, angle, scale, True)
+
+def rotate(image, angle):
+    """like pygame.transform.rotate, but cached"""
+    return CACHE.get(image, angle, 1.0, False)
+
+def mask(image, angle, scale=1.0, smooth=True):
+    """collision mask of rotozoom(image, angle, scale), or of rotate(image, angle) if smooth is False"""
+    return CACHE.mask(image, angle, scale, smooth)
+
+def prewarm(image, scale=1.0, smooth=True, masks=False):
+    CACHE.prewarm(image, scale, smooth, masks)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+spatialhash.py
+uniform grid (spatial hash) for fast collision detection between many sprites
+url: http://thepythongamebook.com/en:part2:pygame:step019
+licence: gpl, see http://www.gnu.org/licenses/gpl.html
+
+pygame.sprite.spritecollide(sprite, group) tests sprite against every
+sprite of group. Testing every projectile against all projectiles costs
+n * n tests: 500 bullets are 250000 tests per frame.
+
+The grid cuts the screen into square cells (CELLSIZE pixels). Every sprite
+is put into the cells its rect touches. Only sprites that share a cell can
+collide, so only those are tested. Rebuild the grid once per frame, after
+the sprites have moved:
+
+    import spatialhash
+    grid = spatialhash.SpatialHash()                 # before the mainloop
+    grid.build(projectilegroup)                      # in the mainloop
+    for bullet in grid.spritecollide(player, bulletgroup, False, pygame.sprite.collide_mask):
+        ...                                          # like pygame.sprite.spritecollide
+    for a, b in grid.pairs():                        # every touching pair only once
+        ...
+
+Only sprites whose rects share a cell are tested. A collided function that
+can find collisions outside of the rects (collide_circle with a big radius)
+may miss some of them.
+
+works with python3.4 and python2.7
+"""
+
+#the next line is only needed for python2.x and not necessary for python3.x
+from __future__ import print_function, division
+
+CELLSIZE = 64 # pixel. about the size of the biggest sprites that are tested often
+
+class SpatialHash(object):
+    """sprites sorted into grid cells by their rect"""
+    def __init__(self, cellsize=CELLSIZE):
+        self.cellsize = cellsize
+        self.cells = {}  # (x, y): list of sprites touching this cell
+        self.places = {} # sprite: (insert number, first cell x, first cell y, last cell x, last cell y)
+
+    def __len__(self):
+        return len(self.places)
+
+    def __contains__(self, sprite):
+        return sprite in self.places
+
+    def cellrange(self, rect):
+        """first and last cell (x0, y0, x1, y1) touched by rect"""
+        x0 = rect.left // self.cellsize
+        y0 = rect.top // self.cellsize
+        x1 = max(x0, (rect.right - 1) // self.cellsize)
+        y1 = max(y0, (rect.bottom - 1) // self.cellsize)
+        return x0, y0, x1, y1
+
+    def clear(self):
+        self.cells.clear()
+        self.places.clear()
+
+    def insert(self, sprite):
+        x0, y0, x1, y1 = self.cellrange(sprite.rect)
+        self.places[sprite] = (len(self.places), x0, y0, x1, y1)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                if (x, y) in self.cells:
+                    self.cells[(x, y)].append(sprite)
+                else:
+                    self.cells[(x, y)] = [sprite]
+
+    def build(self, sprites):
+        """forget everything and insert all sprites (a group or a list), once per frame"""
+        self.clear()
+        for sprite in sprites:
+            self.insert(sprite)
+
+    def nearby(self, rect):
+        """all sprites that share at least one cell with rect"""
+        x0, y0, x1, y1 = self.cellrange(rect)
+        found = set()
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                if (x, y) in self.cells:
+                    found.update(self.cells[(x, y)])
+        return found
+
+    def spritecollide(self, sprite, group=None, dokill=False, collided=None):
+        """works like pygame.sprite.spritecollide(sprite, group, dokill, collided),
+           same arguments, but only tests the sprites of the grid near sprite.
+           Only sprites of group are returned, all sprites of the grid if group
+           is None. Killed sprites are ignored."""
+        found = sorted(self.nearby(sprite.rect), key=self.places.get) # same order as inserted
+        crashgroup = []
+        for other in found:
+            if not other.alive():
+                continue # killed after the grid was built
+            if group is not None and other not in group:
+                continue
+            if collided is None:
+                hit = sprite.rect.colliderect(other.rect)
+            else:
+                hit = collided(sprite, other)
+            if hit:
+                crashgroup.append(other)
+                if dokill:
+                    other.kill()
+        return crashgroup
+
+    def pairs(self, collided=None):
+        """yields every pair (a, b) of colliding sprites once, a was inserted before b.
+           Without collided, the rects are tested (like spritecollide)"""
+        for (x, y), members in self.cells.items():
+            for i in range(len(members) - 1):
+                a = members[i]
+                placea = self.places[a]
+                for b in members[i + 1:]:
+                    placeb = self.places[b]
+                    # a pair that shares several cells is only tested in the
+                    # first (upper left) cell of both
+                    if x != max(placea[1], placeb[1]) or y != max(placea[2], placeb[2]):
+                        continue
+                    if not (a.alive() and b.alive()):
+                        continue
+                    if collided is None:
+                        hit = a.rect.colliderect(b.rect)
+                    else:
+                        hit = collided(a, b)
+                    if hit:
+                        if placea[0] < placeb[0]:
+                            yield a, b
+                        else:
+                            yield b, a
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+spritepool.py
+recycle short-living sprites (fragments, smoke, wounds) instead of creating new ones
+url: http://thepythongamebook.com/en:part2:pygame:step019
+licence: gpl, see http://www.gnu.org/licenses/gpl.html
+
+An explosion creates dozens of Fragment sprites, each with its own new
+Surface, and all of them die within a second or two. Creating and
+collecting so many objects at once makes the game stutter.
+
+A class that inherits from Pooled keeps its killed sprites in a Pool (one
+pool per class). The next time the class is called, like RedFragment(pos),
+an old sprite is taken out of the pool and __init__ runs again on it, so
+__init__ must set every attribute again (most do anyway). sprite.recycled
+tells __init__ if the sprite already has a Surface that can be painted
+again instead of creating a new one:
+
+    class RedFragment(spritepool.Pooled, Fragment):  # Pooled must be the first parent class
+        poolsize = 500                               # optional, default is POOLSIZE
+        ...
+        if self.recycled:
+            self.image.fill((0,0,0,0))               # reuse the old Surface
+        else:
+            self.image = pygame.Surface(...)
+
+A sprite waiting in the pool must not keep other sprites alive: list the
+attributes that point at other sprites in references, they are set to None
+on kill() (__init__ sets them again):
+
+    class Wound(spritepool.Pooled, Fragment):
+        references = ("victim",)
+
+The pool keeps at most poolsize sprites, the rest are thrown away as usual.
+print(spritepool.stats()) shows how often sprites were created and reused.
+
+works with python3.4 and python2.7
+"""
+
+#the next line is only needed for python2.x and not necessary for python3.x
+from __future__ import print_function, division
+
+POOLSIZE = 300 # killed sprites kept per class
+POOLS = []     # all pools, for stats()
+
+class Pool(object):
+    """killed sprites of one class, waiting to be used again"""
+    def __init__(self, name, size=POOLSIZE):
+        self.name = name
+        self.size = size
+        self.free = []
+        self.created = 0  # sprites made with __new__
+        self.reused = 0   # sprites taken out of the pool
+        self.returned = 0 # sprites put back into the pool
+        self.dropped = 0  # killed sprites not kept because the pool was full
+        POOLS.append(self)
+
+    def get(self):
+        """returns a killed sprite, or None if the pool is empty"""
+        if self.free:
+            self.reused += 1
+            return self.free.pop()
+        return None
+
+    def put(self, sprite):
+        if len(self.free) < self.size:
+            self.free.append(sprite)
+            self.returned += 1
+        else:
+            self.dropped += 1
+
+    def stats(self):
+        return "%s pool: %i created, %i reused, %i returned, %i dropped, %i waiting" % (
+            self.name, self.created, self.reused, self.returned, self.dropped, len(self.free))
+
+class Pooled(object):
+    """mixin for pygame sprites: sprites come out of the pool of their class and go back on kill()"""
+    poolsize = POOLSIZE
+    recycled = False # True if __init__ runs on a sprite that was killed before
+    references = ()  # names of attributes pointing at other sprites, forgotten on kill()
+
+    def __new__(cls, *args, **kwargs):
+        pool = cls.__dict__.get("pool") # every class has its own pool, subclasses too
+        if pool is None:
+            pool = Pool(cls.__name__, cls.poolsize)
+            cls.pool = pool
+        sprite = pool.get()
+        if sprite is None:
+            sprite = super(Pooled, cls).__new__(cls)
+            pool.created += 1
+        else:
+            sprite.recycled = True
+        return sprite
+
+    def kill(self):
+        if self.alive(): # kill() can be called several times, put the sprite into the pool only once
+            super(Pooled, self).kill()
+            for name in self.references: # a dead victim must not live on in the pool
+                setattr(self, name, None)
+            self.pool.put(self)
+
+def stats():
+    """one line for each pool"""
+    return "\n".join(pool.stats() for pool in POOLS)
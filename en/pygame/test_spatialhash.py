@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+test_spatialhash.py
+unit tests for spatialhash.py: the grid must find exactly what testing every
+sprite against every other sprite finds.
+run: python -m pytest (or python -m unittest test_spatialhash)
+
+works with python3.4 and python2.7
+"""
+
+#the next line is only needed for python2.x and not necessary for python3.x
+from __future__ import print_function, division
+import random
+import unittest
+try:
+    import pygame
+except ImportError:
+    pygame = None # the tests are skipped
+import spatialhash
+
+class Box(pygame.sprite.Sprite if pygame else object):
+    """a sprite with only a rect"""
+    def __init__(self, rect, *groups):
+        pygame.sprite.Sprite.__init__(self, *groups)
+        self.rect = pygame.Rect(rect)
+        self.radius = min(self.rect.width, self.rect.height) / 2 # for collide_circle, inside of the rect
+
+def randomboxes(rng, count, group, maxsize=150):
+    """boxes all over (and a bit outside of) the screen, some bigger than a cell"""
+    return [Box((rng.randint(-100, 700), rng.randint(-100, 500),
+                 rng.randint(1, maxsize), rng.randint(1, maxsize)), group) for _ in range(count)]
+
+def bruteforce(sprites, collided=None):
+    """every colliding pair (a, b) of the list, a before b"""
+    found = []
+    for i, a in enumerate(sprites):
+        for b in sprites[i + 1:]:
+            if a.alive() and b.alive() and (a.rect.colliderect(b.rect) if collided is None else collided(a, b)):
+                found.append((a, b))
+    return found
+
+@unittest.skipIf(pygame is None, "pygame is not installed")
+class PairsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rng = random.Random(17)
+        self.group = pygame.sprite.Group()
+
+    def test_pairs_like_bruteforce(self):
+        for cellsize in (16, 64, 200):
+            for _ in range(10):
+                self.group.empty()
+                sprites = randomboxes(self.rng, 80, self.group)
+                grid = spatialhash.SpatialHash(cellsize)
+                grid.build(sprites)
+                found = list(grid.pairs())
+                self.assertEqual(len(found), len(set(found))) # every pair only once
+                self.assertEqual(sorted(found, key=self.key), bruteforce(sprites))
+
+    def test_pairs_with_collided(self):
+        sprites = randomboxes(self.rng, 80, self.group)
+        grid = spatialhash.SpatialHash()
+        grid.build(sprites)
+        collided = pygame.sprite.collide_circle # the grid only finds what touches the rects
+        self.assertEqual(sorted(grid.pairs(collided), key=self.key), bruteforce(sprites, collided))
+
+    def test_killed_sprites(self):
+        sprites = randomboxes(self.rng, 80, self.group)
+        grid = spatialhash.SpatialHash()
+        grid.build(sprites)
+        for sprite in sprites[::3]:
+            sprite.kill() # after the grid was built
+        self.assertEqual(sorted(grid.pairs(), key=self.key), bruteforce(sprites))
+
+    def test_spritecollide_like_pygame(self):
+        sprites = randomboxes(self.rng, 120, self.group)
+        others = pygame.sprite.Group(sprites[::2])
+        grid = spatialhash.SpatialHash()
+        grid.build(sprites)
+        for sprite in sprites[:20]:
+            expected = pygame.sprite.spritecollide(sprite, others, False)
+            self.assertEqual(sorted(grid.spritecollide(sprite, others), key=sprites.index),
+                             sorted(expected, key=sprites.index))
+
+    def key(self, pair):
+        """sorts pairs like bruteforce() finds them"""
+        return (self.group.sprites().index(pair[0]), self.group.sprites().index(pair[1]))
+
+if __name__ == "__main__":
+    unittest.main()
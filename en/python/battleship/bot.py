@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Battleship bot: connects to the server like any other client.
+
+The bot fires at the cell where an enemy ship is most probably hidden. For
+every ship that is still afloat it counts how many possible positions of
+that ship (engine.PLACEMENTS) cover each cell, without touching a miss or a
+sunk ship. The cell with the highest count wins. While a ship is hit but not
+sunk yet, only positions that cover the hit cells count (target mode).
+
+The counts are not computed again for every shot: a miss only removes the
+positions that contain the missed cell and subtracts them from the counts.
+So a move costs a few dozen additions instead of a pass over all positions.
+
+usage: python3 bot.py [host] [port] [number of bots] [seconds to wait before each shot]
+"""
+import asyncio
+import random
+import sys
+import time
+
+import engine
+import protocol
+
+CELLS = engine.SIZE * engine.SIZE
+LENGTHS = sorted({length for _, length in engine.FLEET})
+# cells of every placement, and for every cell the placements that contain it
+PLACEMENT_CELLS = {length: [tuple(engine.cells(mask)) for mask in engine.PLACEMENTS[length]]
+                   for length in LENGTHS}
+PLACEMENTS_AT = {}
+for _length in LENGTHS:
+    PLACEMENTS_AT[_length] = [[] for _ in range(CELLS)]
+    for _number, _cells in enumerate(PLACEMENT_CELLS[_length]):
+        for _cell in _cells:
+            PLACEMENTS_AT[_length][_cell].append(_number)
+
+
+class HeatmapAI:
+    """chooses shots by counting the possible ship positions per cell"""
+
+    def __init__(self, rng=random):
+        self.rng = rng
+        self.reset()
+
+    def reset(self):
+        self.afloat = {length: 0 for length in LENGTHS}   # ships not sunk yet, per length
+        for _, length in engine.FLEET:
+            self.afloat[length] += 1
+        self.alive = {length: bytearray(b"\1" * len(PLACEMENT_CELLS[length])) for length in LENGTHS}
+        self.counts = {length: [len(PLACEMENTS_AT[length][cell]) for cell in range(CELLS)]
+                       for length in LENGTHS}
+        self.shots = 0
+        self.hits = 0
+        self.sunk = 0
+
+    def block(self, cell):
+        """no (further) ship can be at cell: remove all positions that cover it"""
+        for length in LENGTHS:
+            alive = self.alive[length]
+            counts = self.counts[length]
+            cells_of = PLACEMENT_CELLS[length]
+            for number in PLACEMENTS_AT[length][cell]:
+                if alive[number]:
+                    alive[number] = 0
+                    for other in cells_of[number]:
+                        counts[other] -= 1
+
+    def update(self, shots, hits, sunk):
+        """learn from a snapshot (masks of all own shots, own hits, sunk enemy ships)"""
+        if shots & self.shots != self.shots:   # a new battle has started
+            self.reset()
+        for cell in engine.cells(shots & ~hits & ~self.shots):   # new misses
+            self.block(cell)
+        new_sunk = sunk & ~self.sunk
+        if new_sunk:
+            length = bin(new_sunk).count("1")   # only one ship sinks per shot
+            if self.afloat.get(length):
+                self.afloat[length] -= 1
+            for cell in engine.cells(new_sunk):
+                self.block(cell)
+        self.shots, self.hits, self.sunk = shots, hits, sunk
+
+    def choose(self):
+        """returns the cell number to fire at next"""
+        scores = [0] * CELLS
+        open_hits = self.hits & ~self.sunk
+        if open_hits:   # target mode: finish the ship that is already hit
+            for hit in engine.cells(open_hits):
+                for length in LENGTHS:
+                    if not self.afloat[length]:
+                        continue
+                    alive = self.alive[length]
+                    for number in PLACEMENTS_AT[length][hit]:
+                        if alive[number]:
+                            cells_of = PLACEMENT_CELLS[length][number]
+                            for other in cells_of:
+                                scores[other] += self.afloat[length]
+        if not open_hits or not any(scores):   # hunt mode: density of all ships afloat
+            for length in LENGTHS:
+                if self.afloat[length]:
+                    weight = self.afloat[length]
+                    for cell, count in enumerate(self.counts[length]):
+                        scores[cell] += weight * count
+        best = -1
+        choices = []
+        for cell in range(CELLS):
+            if self.shots >> cell & 1:
+                continue
+            if scores[cell] > best:
+                best = scores[cell]
+                choices = [cell]
+            elif scores[cell] == best:
+                choices.append(cell)
+        return self.rng.choice(choices)
+
+
+async def run_bot(host, port, name, timings, delay=0.1):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(protocol.join(name))
+    ai = HeatmapAI()
+    parser = protocol.FrameParser()
+    waiting_for = None   # shots mask of the last shot sent: do not fire twice at the same state
+    while True:
+        data = await reader.read(64 * 1024)
+        if not data:
+            break
+        for msgtype, payload in parser.feed(data):
+            if msgtype == protocol.QUIT:
+                writer.close()
+                return
+            if msgtype == protocol.PING:
+                writer.write(protocol.pong())
+            if msgtype != protocol.STATE:
+                continue
+            state = engine.read_snapshot(payload)
+            if state["shots"] == waiting_for:
+                continue   # the answer to our last shot did not arrive yet
+            waiting_for = None
+            start = time.perf_counter()
+            ai.update(state["shots"], state["hits"], state["sunk"])
+            if state["status"] == 1:   # my turn
+                target = ai.choose()
+                timings.append(time.perf_counter() - start)
+                # the server limits the messages per second, and humans like to see the shots
+                asyncio.get_running_loop().call_later(delay, writer.write, protocol.shot(engine.coordinate(target)))
+                waiting_for = state["shots"]
+    writer.close()
+
+
+async def main(host, port, bots, delay):
+    timings = []
+    tasks = [asyncio.create_task(run_bot(host, port, "bot{}".format(number), timings, delay))
+             for number in range(bots)]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if timings:
+            print("{} moves, {:.1f} microseconds per move".format(
+                len(timings), 1e6 * sum(timings) / len(timings)))
+
+
+if __name__ == "__main__":
+    HOST = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1"
+    PORT = int(sys.argv[2]) if len(sys.argv) > 2 else 33000
+    BOTS = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    DELAY = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1
+    try:
+        asyncio.run(main(HOST, PORT, BOTS, DELAY))
+    except (KeyboardInterrupt, ConnectionError):
+        pass
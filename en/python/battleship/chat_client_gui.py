@@ -1,31 +1,72 @@
 from socket import AF_INET, socket, SOCK_STREAM
-from threading import Thread
+from threading import Thread, Lock
 import PySimpleGUI as sg
+import collections
+import queue
 import sys
+import time
 import random
+import protocol
+import engine
 '''
 Battleship-chat-client
+
+the receive thread does not touch the window. it puts every incoming line into
+the inbox queue, and the gui loop takes all waiting lines at most REFRESH times
+per second and redraws the chat once for all of them. only the last HISTORY
+lines are kept.
 '''
+REFRESH = 30      # chat redraws per second, at most
+HISTORY = 500     # lines in the chat window
 
 
 def receive():
-    """Handles receiving of messages."""
+    """Handles receiving of messages. One recv may contain several (or half a) frame."""
+    parser = protocol.FrameParser()
     while True:
         try:
-            msg = client_socket.recv(BUFSIZ).decode("utf8")
-            #msg_list.insert(tkinter.END, msg)
-            print(msg)
-        except OSError:  # Possibly client has left the chat.
+            data = client_socket.recv(BUFSIZ)
+            if not data:   # server closed the connection
+                break
+            for msgtype, payload in parser.feed(data):
+                if msgtype == protocol.QUIT:
+                    return
+                if msgtype == protocol.PING:   # server checks if we are still alive
+                    with send_lock:
+                        client_socket.sendall(protocol.pong())
+                elif msgtype == protocol.PONG:
+                    pass
+                elif msgtype == protocol.STATE:
+                    inbox.put(engine.render(payload))
+                elif msgtype == protocol.KEY:   # lost the connection? start again with this key to get the seat back
+                    inbox.put("your seat key: {}".format(protocol.text(payload)))
+                else:
+                    inbox.put(protocol.text(payload))
+        except (OSError, protocol.ProtocolError):  # Possibly client has left the chat.
             break
 
 
 def send(msg, event=None):  # event is passed by binders.
-    """Handles sending of messages."""
-    client_socket.send(bytes(msg, "utf8"))
-    if msg == "quit":
+    """Handles sending of messages. 'quit' ends the game, a coordinate like 'A2' is a shot"""
+    with send_lock:   # the receive thread may send a pong at the same time
+        client_socket.sendall(protocol.from_user_input(msg))
+    if msg.strip().lower() == "quit":
         client_socket.close()
         #top.quit()
 
+def drain_inbox(window, history):
+    """moves all waiting lines into the history (a ring buffer) and redraws the chat once"""
+    new = False
+    while True:
+        try:
+            lines = inbox.get_nowait()
+        except queue.Empty:
+            break
+        history.extend(lines.split("\n"))
+        new = True
+    if new:
+        window['chat'].update('\n'.join(history))
+
 #def on_closing(event=None):
 #    """This function is to be called when the window is closed."""
 #    #my_msg.set("{quit}")
@@ -37,7 +78,7 @@ def ChatBotWithHistory():
     #sg.theme('GreenTan')
 
     layout = [[sg.Text("chat-window (don't write here)", size=(40, 1))],
-              [sg.Output(size=(127, 30), font=('Helvetica 10'))],
+              [sg.Multiline(size=(127, 30), font=('Courier 10'), key='chat', autoscroll=True, disabled=True)],
               [sg.Text('Command History'),
                sg.Text('', size=(20, 3), key='history')],
               [sg.ML(size=(85, 5), enter_submits=True, key='query', do_not_clear=False),
@@ -53,9 +94,14 @@ def ChatBotWithHistory():
     # ---===--- Loop taking in user input and using it  --- #
     command_history = []
     history_offset = 0
+    history = collections.deque(maxlen=HISTORY)
+    next_redraw = 0
 
     while True:
-        event, value = window.read()
+        event, value = window.read(timeout=1000 // REFRESH)
+        if time.monotonic() >= next_redraw:
+            drain_inbox(window, history)
+            next_redraw = time.monotonic() + 1 / REFRESH
 
         if event in (sg.WIN_CLOSED, 'EXIT'):  # quit if exit event or X
             break
@@ -63,7 +109,7 @@ def ChatBotWithHistory():
         elif event == 'SEND':
             query = value['query'].rstrip()
             send(query)  # send to chat server
-            print('The command you entered was {}'.format(query))
+            inbox.put('The command you entered was {}'.format(query))
             command_history.append(query)
             history_offset = len(command_history) - 1
             # manually clear input because keyboard events blocks clear
@@ -88,10 +134,13 @@ def ChatBotWithHistory():
 
 if __name__ == "__main__":
     args = sys.argv
-    if len(args) == 4:
+    KEY = None
+    if len(args) in (4, 5):
         HOST = args[1]
         PORT = args[2]          # is a string!
         NAME = args[3]
+        if len(args) == 5:
+            KEY = args[4]       # seat key of a match we lost the connection to
     else:
         HOST = "127.0.0.1"
         PORT = "33000"
@@ -102,15 +151,17 @@ if __name__ == "__main__":
         PORT = sg.PopupGetText(message="please enter porst:", default_text=PORT)
         NAME = sg.PopupGetText(message="please enter your nickname:", default_text = NAME)
 
-    BUFSIZ = 1024
+    BUFSIZ = 64 * 1024
     ADDR = (HOST, int(PORT))
 
     client_socket = socket(AF_INET, SOCK_STREAM)
     client_socket.connect(ADDR)
 
-    receive_thread = Thread(target=receive)
+    inbox = queue.SimpleQueue()   # lines from the receive thread for the gui
+    send_lock = Lock()
+    receive_thread = Thread(target=receive, daemon=True)
     receive_thread.start()
-    send(NAME)
-    print("sending name:", NAME)
+    client_socket.sendall(protocol.join(NAME, KEY))
+    inbox.put("sending name: {}".format(NAME))
     ChatBotWithHistory()
 
@@ -1,94 +1,359 @@
 #!/usr/bin/env python3
-"""Server for multithreaded (asynchronous) chat application."""
-from socket import AF_INET, socket, SOCK_STREAM
-from threading import Thread
+"""Server for the battleship chat application.
 
+asyncio version: instead of one Thread per client (see chat_serv.py) every
+client is handled by one coroutine, and all coroutines share a single event
+loop. An idle client costs only a few kilobytes, so one process can hold
+many thousands of connections.
 
-def accept_incoming_connections():
-    """Sets up handling for incoming clients."""
+The server counts what it does (metrics.py). Start it with a stats port to
+read the numbers while it runs: curl http://127.0.0.1:<stats port>
+"""
+import asyncio
+import sys
+import time
+
+import engine
+import metrics
+import protocol
+from connection import Connection
+from eventlog import EventLog
+from rooms import MatchManager
+
+try:
+    import resource   # not available on windows
+except ImportError:
+    resource = None
+
+
+async def read_frames(reader, parser, first=(), conn=None):
+    """async generator: yields (msgtype, payload) frames until the client disconnects.
+       first: frames that were already received before. conn: Connection, to note when the client was seen"""
+    for frame in first:
+        yield frame
     while True:
-        client, client_address = SERVER.accept()   # client_adress is ip and port
-        print("client {}:{} has connected with server".format(client_address[0], client_address[1]))
-        #client.send(bytes("Welcome to Battleships! Please type your name and press enter!", "utf8"))
-        addresses[client] = client_address
-        Thread(target=handle_client, args=(client,)).start()
+        data = await reader.read(BUFSIZ)
+        if not data:   # connection closed by client
+            return
+        if conn is not None:
+            conn.last_seen = conn.loop.time()
+        BYTES_RECEIVED.inc(len(data))
+        frames = parser.feed(data)
+        FRAMES_RECEIVED.inc(len(frames))
+        for frame in frames:
+            yield frame
+        await asyncio.sleep(0)   # read() does not yield if data is waiting: let the writer tasks run
+
 
+async def read_join(reader, parser):
+    """waits for the first frame, which must be a JOIN with the nickname (and maybe the key of a seat).
+       returns (name, key, frames that arrived together with the JOIN). name is None if the client failed"""
+    try:
+        while True:
+            data = await reader.read(BUFSIZ)
+            if not data:   # client left before telling us his name
+                return None, None, []
+            frames = parser.feed(data)
+            if frames:
+                msgtype, payload = frames[0]
+                if msgtype != protocol.JOIN:
+                    return None, None, []
+                return protocol.parse_join(payload) + (frames[1:],)
+    except (OSError, protocol.ProtocolError):
+        return None, None, []
 
-def handle_client(client):  # Takes client socket as argument.
+
+async def accept_join(reader, writer):
+    """refuses the client if the server is full, otherwise waits (JOIN_TIMEOUT at most) for his JOIN.
+       returns (name, key, parser, frames that came with the JOIN) or None"""
+    global joining
+    if len(addresses) + joining >= MAX_CONNECTIONS:
+        CONNECTIONS_REFUSED.inc()
+        writer.write(protocol.info("sorry, the server is full"))
+        writer.close()
+        return None
+    parser = protocol.FrameParser()
+    joining += 1
+    try:
+        name, key, early = await asyncio.wait_for(read_join(reader, parser), JOIN_TIMEOUT)
+    except asyncio.TimeoutError:
+        name = None
+    finally:
+        joining -= 1
+    if name is None:
+        writer.transport.abort()
+        return None
+    return name, key, parser, early
+
+
+async def handle_client(reader, writer):   # one coroutine per client
     """Handles a single client connection."""
-    name = client.recv(BUFSIZ).decode("utf8")
-    #welcome = "Welcome {}! type 'quit' to exit".format(name)
-
-    if players[0] is None:
-        index = 0
-        client.send(bytes("welcome player1 ","utf8"))
-        print("welcome player1")
-        players[0] = name
-    elif players[1] is None:
-        index = 1
-        client.send(bytes("welcome player2 ","utf8"))
-        print("welcome player2")
-        players[1] = name
-
-    broadcast("player{} ({}) has joined the chat!".format(index+1, name), "server:")
-    #broadcast(bytes(msg, "utf8"))
-    clients[client] = name
-    if players[0] is not None and players[1] is not None:
-        broadcast("may the game begin!", "server:")
+    address = writer.get_extra_info("peername")   # ip and port
+    print("client {}:{} has connected with server".format(address[0], address[1]))
+    CONNECTIONS.inc()
+    joined = await accept_join(reader, writer)
+    if joined is not None:
+        await play(reader, writer, *joined)
+
+
+async def play(reader, writer, name, key, parser, early=()):
+    """puts the client into a match and handles all his messages until he leaves.
+       key: the secret of a seat that waits for this player, see rooms.py"""
+    conn = Connection(writer, QUEUE_SIZE, SLOW_CLIENT_POLICY, MESSAGE_RATE, MESSAGE_BURST)
+    addresses[conn] = conn.address
+    frames = read_frames(reader, parser, early, conn)
+    match = None
+    quitting = False
+    try:
+        match, index = matches.join(conn, name, key)
+        if eventlog is not None:
+            eventlog.join(match, index, name)
+        conn.send(protocol.info("welcome player{} (match {}) ".format(index+1, match.match_id)))
+        conn.send(protocol.key(match.keys[index]))
+        print("welcome player{} in match {}".format(index+1, match.match_id))
+        broadcast(match, "player{} ({}) has joined the chat!".format(index+1, name), "server:", protocol.INFO)
+        clients[conn] = name
+        if match.is_full() and match.battle is None:   # a restored match keeps its battle
+            start_battle(match)
+        elif match.battle is not None:
+            send_state(match)
+        async for msgtype, payload in frames:
+            if not conn.allow():   # too many messages
+                MESSAGES_LIMITED.inc()
+                if conn.closed:
+                    break
+                continue
+            if msgtype == protocol.QUIT:
+                conn.send(protocol.quit())
+                quitting = True
+                break
+            elif msgtype == protocol.PING:
+                conn.send(protocol.pong())
+            elif msgtype == protocol.SHOT:
+                if match.battle is None:
+                    conn.send(protocol.info("please wait for an opponent"))
+                    continue
+                try:
+                    target = engine.cell(protocol.text(payload))
+                    result, ship = match.battle.fire(index, target)
+                except engine.RuleError as error:
+                    conn.send(protocol.info(str(error)))
+                    continue
+                if eventlog is not None:
+                    eventlog.shot(match, index, target)
+                report = "fires at {}: {}".format(engine.coordinate(target), result)
+                if ship is not None:
+                    report += " ({} sunk)".format(ship)
+                broadcast(match, report, "player{}({}) ".format(index+1, name), protocol.SHOT)
+                send_state(match)
+                if result == engine.WON:
+                    broadcast(match, "player{} ({}) wins the battle!".format(index+1, name), "server:", protocol.INFO)
+                    start_battle(match)
+            elif msgtype == protocol.PLACE:
+                if match.battle is None:
+                    conn.send(protocol.info("please wait for an opponent"))
+                    continue
+                try:
+                    match.battle.place(index, engine.parse_fleet(protocol.text(payload)))
+                except engine.RuleError as error:
+                    conn.send(protocol.info(str(error)))
+                    continue
+                if eventlog is not None:
+                    eventlog.place(match, index)
+                conn.send(protocol.state(match.battle.snapshot(index)))
+            elif msgtype == protocol.TICK:
+                try:
+                    tick = int(protocol.text(payload))
+                except ValueError:
+                    tick = -1
+                if not 0 <= tick <= MAX_TICK:
+                    conn.send(protocol.info("the tick must be 0 (off) to {} per second".format(MAX_TICK)))
+                    continue
+                match.set_tick(tick)
+                broadcast(match, "player{} ({}) set the tick to {} per second".format(index+1, name, tick),
+                          "server:", protocol.INFO)
+            elif msgtype == protocol.CHAT:
+                broadcast(match, protocol.text(payload), "player{} ({}):".format(index+1, name))
+    except (OSError, protocol.ProtocolError):
+        pass
+    finally:   # whatever happened: forget everything about this client
+        await frames.aclose()
+        del addresses[conn]
+        clients.pop(conn, None)
+        conn.close()   # sends what is still queued, then closes the socket
+        if match is not None:
+            if quitting or match.battle is None or match.battle.winner is not None:
+                leave(match, index)
+            else:   # connection lost in the middle of a battle: the seat and the battle wait for him
+                matches.hold(match, index)
+                broadcast(match, "player{}({}) lost the connection, waiting {} seconds for him".format(
+                    index+1, name, REJOIN_TIMEOUT), "server:", protocol.INFO)
+                expire_later(match, index)
+
+
+def leave(match, index):
+    """the player gives up his seat and the battle is over. if the other seat only waits
+       for its player, the match is abandoned and that seat is freed too"""
+    name = match.players[index]
+    matches.leave(match, index)
+    match.battle = None
+    if eventlog is not None:
+        eventlog.leave(match, index)
+    broadcast(match, "player{}({}) has left the chat".format(index+1, name), "server:", protocol.INFO)
+    for other, conn in enumerate(match.connections):
+        if conn is None and match.players[other] is not None:
+            leave(match, other)
+
+
+def expire_later(match, index):
+    """frees a waiting seat if its player does not come back within REJOIN_TIMEOUT seconds"""
+    asyncio.get_running_loop().call_later(REJOIN_TIMEOUT, expire, match, index, match.keys[index])
+
+
+def expire(match, index, key):
+    # a player who came back got a new key, and a removed match is not touched again
+    if matches.matches.get(match.match_id) is match and match.keys[index] == key and match.connections[index] is None:
+        leave(match, index)
+
+
+def start_battle(match):
+    """new battle with random fleets. players may place their own fleet until the first shot"""
+    match.battle = engine.Battle()
+    match.battle.place_random(0)
+    match.battle.place_random(1)
+    if eventlog is not None:
+        eventlog.battle(match)
+    broadcast(match, "may the game begin! player1 fires first. your fleet was placed at random, "
+                     "type 'place A1-A5 C1-C4 E1-E3 G1-G3 I1-I2' to place it yourself", "server:", protocol.INFO)
+    send_state(match)
+
 
+def send_state(match):
+    """every player gets his own view of the battle"""
+    for index, conn in enumerate(match.connections):
+        if conn is not None:
+            conn.send(protocol.state(match.battle.snapshot(index)))
+
+
+def broadcast(match, msg, prefix="", msgtype=protocol.CHAT):    # prefix tells who is sending the message.
+    """Broadcasts a message to the players of one match. The frame is encoded only once and
+       shared by all send queues, a slow client does not delay the others."""
+    start = time.perf_counter()
+    match.broadcast(protocol.encode(msgtype, prefix + msg))
+    BROADCAST_TIME.observe((time.perf_counter() - start) * 1e6)
+
+
+async def watch_connections():
+    """every HEARTBEAT seconds: ping quiet clients, disconnect dead ones"""
+    loop = asyncio.get_running_loop()
     while True:
-        msg = client.recv(BUFSIZ)  # msg is in byte format
-        #create string:
-        message = "".join([chr(i) for i in msg])
-
-        #if msg != bytes("quit", "utf8"):
-        #    broadcast(msg, "player{} ({}): ".format(index+1,name))#, "utf8")
-        #else:
-        if message == "quit":
-            client.send(bytes("quit", "utf8"))
-            client.close()
-            del clients[client]
-            broadcast("player{}({}) has left the chat".format(index+1, name), "server:")   # , "utf8"))
-            break
-        if message.lower()=="a2" and Game.turn % 2 == index:
-            broadcast("mfires at A2", "player{}({})".format(index+1, name))
-            Game.turn += 1
-            broadcast("turn {}. It is your turn, player{}".format(Game.turn, index+1))
-        else:
-            broadcast(message, "player{} ({}):".format(index+1,name))
-
-
-
-def broadcast(msg, prefix=""):    # prefix tells who is sending the message.
-    """Broadcasts a message to all the clients. converts msg to bytes if necessary"""
-    msg2 = msg if isinstance(msg, bytes) else bytes(msg, 'utf8')
-    for sock in clients:
-        #sock.send(bytes(prefix, "utf8") + msg)
-        #print("message:", msg, type(msg))
-        #print("prefix:", prefix)
-        sock.send(bytes(prefix, "utf8") + msg2)
-
-class Game:
-    turn = 1
-
-
-players = [None, None]
-clients = {}
-addresses = {}
+        await asyncio.sleep(HEARTBEAT)
+        now = loop.time()
+        for conn in list(addresses):
+            conn.check(now, HEARTBEAT, IDLE_TIMEOUT, SEND_TIMEOUT)
+
+
+def raise_open_file_limit():
+    """every connection is an open file. raise the soft limit as far as the system allows"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or hard > soft:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def queued_frames():
+    """frames waiting in all send queues"""
+    return sum(conn.queue.qsize() for conn in addresses)
+
+
+def longest_queue():
+    return max((conn.queue.qsize() for conn in addresses), default=0)
+
+
+async def main(log_directory=None, stats_port=None):
+    global eventlog
+    raise_open_file_limit()
+    if log_directory is not None:
+        eventlog = EventLog(log_directory)
+        restored = eventlog.recover()
+        for match in restored:
+            matches.restore(match)
+            for index, name in enumerate(match.players):
+                if name is not None:
+                    expire_later(match, index)
+        print("{} matches recovered from {}".format(len(restored), log_directory))
+        eventlog.start()
+    watcher = asyncio.create_task(watch_connections())
+    stats_log = asyncio.create_task(metrics.REGISTRY.log_every(STATS_INTERVAL, STATS_LOGGED))
+    if stats_port is not None:
+        await metrics.REGISTRY.serve(STATS_HOST, stats_port)
+        print("stats on http://{}:{}".format(STATS_HOST, stats_port))
+    server = await asyncio.start_server(handle_client, HOST, PORT, backlog=BACKLOG)
+    print("Waiting for connection...")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+        stats_log.cancel()
+        if eventlog is not None:
+            await eventlog.close()   # write what is still pending
+
+
+matches = MatchManager()
+eventlog = None  # EventLog, if the server was started with a log directory
+clients = {}     # Connection: name
+addresses = {}   # Connection: (ip, port)
+joining = 0      # clients that are connected but did not send their JOIN yet
+
+CONNECTIONS = metrics.counter("connections_total", "clients that connected")
+CONNECTIONS_REFUSED = metrics.counter("connections_refused_total", "clients refused because the server was full")
+FRAMES_RECEIVED = metrics.counter("frames_received_total", "frames received from clients")
+BYTES_RECEIVED = metrics.counter("bytes_received_total", "bytes received from clients")
+MESSAGES_LIMITED = metrics.counter("messages_limited_total", "messages ignored because a client sent too fast")
+BROADCAST_TIME = metrics.histogram("broadcast_microseconds", metrics.MICROSECONDS,
+                                   "time to put one broadcast into the send queues of a match")
+metrics.gauge("connections_open", lambda: len(addresses), "clients that joined and are still connected")
+metrics.gauge("connections_joining", lambda: joining, "clients that did not send their JOIN yet")
+metrics.gauge("matches_active", lambda: len(matches.matches), "matches with at least one player")
+metrics.gauge("send_queue_frames", queued_frames, "frames waiting in all send queues")
+metrics.gauge("send_queue_longest", longest_queue, "frames waiting in the longest send queue")
 
 
 HOST = ''
 PORT = 33000
-BUFSIZ = 1024
-ADDR = (HOST, PORT)
-
-SERVER = socket(AF_INET, SOCK_STREAM)
-SERVER.bind(ADDR)
+BUFSIZ = 64 * 1024   # one read may contain many frames
+BACKLOG = 1024   # many clients may connect at the same moment
+QUEUE_SIZE = 256   # outgoing frames per client
+SLOW_CLIENT_POLICY = "disconnect"   # or "drop": what to do when a client queue is full
+MAX_CONNECTIONS = 20000
+MESSAGE_RATE = 20     # messages per second and client ...
+MESSAGE_BURST = 40    # ... and that many at once
+HEARTBEAT = 15        # seconds: quiet clients get a ping
+IDLE_TIMEOUT = 45     # seconds without any message: client is dead
+SEND_TIMEOUT = 30     # seconds a client may not read what we send
+JOIN_TIMEOUT = 10     # seconds to send the JOIN after connecting
+REJOIN_TIMEOUT = 120  # seconds a seat waits for a player who lost his connection (or after a restart)
+TICK = 0              # flushes per second of a new match, 0: every frame is sent at once (see rooms.py)
+MAX_TICK = 60         # players may change the tick of their match: "tick 30"
+STATS_HOST = "127.0.0.1"   # the stats port is only reachable from this machine
+STATS_INTERVAL = 60   # seconds between two stats lines in the log
+STATS_LOGGED = ("connections_open", "matches_active", "frames_received_total", "frames_sent_total",
+                "frames_dropped_total", "send_queue_frames")
 
 if __name__ == "__main__":
-    SERVER.listen(5)
-    print("Waiting for connection...")
-    ACCEPT_THREAD = Thread(target=accept_incoming_connections)
-    ACCEPT_THREAD.start()
-    ACCEPT_THREAD.join()
-    SERVER.close()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        PORT = int(sys.argv[1])
+    LOG_DIRECTORY = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != "-" else None   # matches survive a restart
+    STATS_PORT = int(sys.argv[3]) if len(sys.argv) > 3 and sys.argv[3] != "-" else None
+    if len(sys.argv) > 4:
+        TICK = int(sys.argv[4])
+    matches.tick = TICK
+    try:
+        asyncio.run(main(LOG_DIRECTORY, STATS_PORT))
+    except KeyboardInterrupt:
+        print("server stopped")
@@ -0,0 +1,166 @@
+"""One client connection of the battleship server, with its own send queue.
+
+broadcast() must never wait for a single client: a slow (or dead) client
+would otherwise delay the message for everyone. So every Connection has a
+bounded queue of outgoing frames and its own writer task that empties it.
+broadcast() only puts the (shared, already encoded) frame into each queue.
+When the queue of a client is full, the client is too slow and the policy
+decides: DROP the frame or DISCONNECT the client.
+
+A Connection also watches the health of the client: check() is called
+regularly and pings a client that was quiet for a while, and aborts a client
+that did not answer, or that did not read what we sent for too long.
+allow() is a token bucket that limits the messages per second of a client.
+
+While the client plays in a match with a tick (see rooms.py), send() only
+collects the frames in outbox; the match calls flush() once per tick, which
+queues them as one piece. The outbox has the same limit as the queue, a
+client that collects more frames in one tick is handled by the same policy.
+"""
+import asyncio
+
+import metrics
+import protocol
+
+DROP = "drop"
+DISCONNECT = "disconnect"
+
+QUEUE_SIZE = 256      # frames waiting per client
+CLOSE_TIMEOUT = 10    # seconds to send the rest after close(), then the socket is aborted
+
+FRAMES_SENT = metrics.counter("frames_sent_total", "frames (or tick batches) written to client sockets")
+BYTES_SENT = metrics.counter("bytes_sent_total", "bytes written to client sockets")
+FRAMES_DROPPED = metrics.counter("frames_dropped_total", "frames that did not fit into a send queue")
+
+
+class Connection:
+    """stream writer + bounded queue of outgoing frames + writer task"""
+
+    def __init__(self, writer, maxsize=QUEUE_SIZE, policy=DISCONNECT, rate=20, burst=40):
+        self.loop = asyncio.get_running_loop()
+        self.writer = writer
+        self.address = writer.get_extra_info("peername")   # ip and port
+        self.queue = asyncio.Queue(maxsize)
+        self.policy = policy
+        self.dropped = 0      # frames that did not fit into the queue
+        self.closed = False
+        self.aborted = False  # closed without sending the rest
+        self.last_seen = self.loop.time()   # last time the client sent something
+        self.blocked_since = None           # the client does not read, drain() waits since then
+        self.rate = rate                    # messages per second allowed
+        self.burst = burst                  # ... and that many at once
+        self.tokens = burst
+        self.refilled = self.last_seen
+        self.ticker = None    # Match that flushes the outbox every tick, None: frames are queued at once
+        self.outbox = []      # frames of the current tick
+        self.task = asyncio.create_task(self._write_loop())
+
+    def send(self, frame):
+        """queues frame (bytes) for sending, never blocks. returns False if the frame was not queued"""
+        if self.closed:
+            return False
+        if self.ticker is not None:
+            if 0 < self.queue.maxsize <= len(self.outbox):
+                return self._overflow()
+            if not self.outbox:
+                self.ticker.wake()
+            self.outbox.append(frame)
+            return True
+        return self._put(frame)
+
+    def flush(self):
+        """queues the frames collected since the last tick, glued together into one write"""
+        if not self.outbox or self.closed:
+            return
+        frames, self.outbox = self.outbox, []
+        self._put(frames[0] if len(frames) == 1 else b"".join(frames))
+
+    def _put(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            return self._overflow()
+        return True
+
+    def _overflow(self):
+        """a frame did not fit: drop it, or disconnect the client. returns False"""
+        self.dropped += 1
+        FRAMES_DROPPED.inc()
+        if self.policy == DISCONNECT:
+            print("client {}:{} is too slow, disconnecting".format(*self.address[:2]))
+            self.close(flush=False)
+        return False
+
+    def close(self, flush=True):
+        """stops sending. with flush=True the frames already queued are sent first,
+           but not longer than CLOSE_TIMEOUT seconds"""
+        if self.aborted or self.task.done():
+            return
+        if flush:
+            self.flush()
+        if flush and not self.closed and not self.queue.full():
+            self.closed = True
+            self.queue.put_nowait(None)   # None tells the writer task to stop
+            self.loop.call_later(CLOSE_TIMEOUT, self.close, False)
+        else:
+            self.closed = True
+            self.aborted = True
+            self.task.cancel()
+
+    def allow(self):
+        """token bucket: False if the client sends more than rate messages per second.
+           a client that keeps flooding is disconnected"""
+        now = self.loop.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return True
+        if self.tokens < -self.burst:
+            print("client {}:{} sends too fast, disconnecting".format(*self.address[:2]))
+            self.close(flush=False)
+        return False
+
+    def check(self, now, heartbeat, idle_timeout, send_timeout):
+        """called regularly: pings a quiet client, aborts a dead one"""
+        if now - self.last_seen > idle_timeout:
+            print("client {}:{} does not answer, disconnecting".format(*self.address[:2]))
+            self.close(flush=False)
+        elif self.blocked_since is not None and now - self.blocked_since > send_timeout:
+            print("client {}:{} does not read, disconnecting".format(*self.address[:2]))
+            self.close(flush=False)
+        elif now - self.last_seen > heartbeat:
+            self.send(protocol.ping())
+
+    async def _write_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                if frame is None:
+                    break
+                # everything else that is waiting goes out with the same write() and drain()
+                batch = [frame]
+                stop = False
+                while not self.queue.empty():
+                    frame = self.queue.get_nowait()
+                    if frame is None:
+                        stop = True
+                        break
+                    batch.append(frame)
+                data = batch[0] if len(batch) == 1 else b"".join(batch)
+                self.writer.write(data)   # one send() instead of one per frame
+                FRAMES_SENT.inc(len(batch))
+                BYTES_SENT.inc(len(data))
+                if stop:
+                    break
+                self.blocked_since = self.loop.time()
+                await self.writer.drain()   # waits only if this client does not read
+                self.blocked_since = None
+        except (OSError, asyncio.CancelledError):
+            pass
+        finally:
+            self.closed = True
+            if self.aborted:
+                self.writer.transport.abort()   # close() would wait for the client to read
+            else:
+                self.writer.close()
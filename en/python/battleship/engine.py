@@ -0,0 +1,225 @@
+"""Rules of battleship, for the server.
+
+The board has 10 x 10 cells. Cell number = row * 10 + column, with
+row 0 = "1" and column 0 = "A", so "A1" is cell 0 and "J10" is cell 99.
+A set of cells is stored as one python integer with 100 bits: bit n is set
+if cell n belongs to the set. A ship, a whole fleet or all shots of a player
+are such integers, and the rules become bit operations:
+
+    hit?          fleet & bit
+    ship sunk?    ship & shots == ship
+    game over?    fleet & ~shots == 0
+    overlapping?  fleet & ship
+
+PLACEMENTS lists every possible position of a ship of each size, the bot
+(bot.py) uses it too.
+"""
+import random
+import struct
+
+SIZE = 10
+COLUMNS = "ABCDEFGHIJ"
+FLEET = (("carrier", 5), ("battleship", 4), ("cruiser", 3), ("submarine", 3), ("destroyer", 2))
+ALL_CELLS = (1 << SIZE * SIZE) - 1
+
+# shot results
+MISS = "miss"
+HIT = "hit"
+SUNK = "sunk"
+WON = "won"
+
+
+class RuleError(ValueError):
+    """a move that is against the rules"""
+
+
+def cell(coordinate):
+    """'A2' -> 10 (cell number)"""
+    coordinate = coordinate.strip().upper()
+    try:
+        column = COLUMNS.index(coordinate[0])
+        row = int(coordinate[1:]) - 1
+    except (IndexError, ValueError):
+        raise RuleError("not a coordinate: {}".format(coordinate))
+    if not 0 <= row < SIZE:
+        raise RuleError("not a coordinate: {}".format(coordinate))
+    return row * SIZE + column
+
+
+def coordinate(number):
+    """10 -> 'A2'"""
+    return "{}{}".format(COLUMNS[number % SIZE], number // SIZE + 1)
+
+
+def cells(mask):
+    """yields the cell numbers of all bits set in mask"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def ship_mask(start, end):
+    """bitmask of a straight ship from cell start to cell end (both included)"""
+    row1, column1 = divmod(min(start, end), SIZE)
+    row2, column2 = divmod(max(start, end), SIZE)
+    if row1 == row2:
+        return sum(1 << (row1 * SIZE + c) for c in range(column1, column2 + 1))
+    if column1 == column2:
+        return sum(1 << (r * SIZE + column1) for r in range(row1, row2 + 1))
+    raise RuleError("ships must be horizontal or vertical")
+
+
+def _all_placements(length):
+    placements = []
+    for row in range(SIZE):
+        for column in range(SIZE - length + 1):
+            placements.append(ship_mask(row * SIZE + column, row * SIZE + column + length - 1))
+    for column in range(SIZE):
+        for row in range(SIZE - length + 1):
+            placements.append(ship_mask(row * SIZE + column, (row + length - 1) * SIZE + column))
+    return placements
+
+
+PLACEMENTS = {length: _all_placements(length) for length in {length for _, length in FLEET}}
+
+
+def parse_fleet(text):
+    """'A1-A5 C1-C4 ...' -> list of ship masks, in the order of FLEET"""
+    ships = []
+    for part in text.replace(",", " ").split():
+        start, _, end = part.partition("-")
+        ships.append(ship_mask(cell(start), cell(end or start)))
+    return ships
+
+
+def random_fleet(rng=random):
+    """returns a list of ship masks in the order of FLEET, placed at random without overlap"""
+    while True:
+        fleet = 0
+        ships = []
+        for _, length in FLEET:
+            free = [ship for ship in PLACEMENTS[length] if not ship & fleet]
+            if not free:
+                break   # very unlikely: start again
+            ship = rng.choice(free)
+            ships.append(ship)
+            fleet |= ship
+        else:
+            return ships
+
+
+class Battle:
+    """The state of one match: both fleets, both shot histories, whose turn it is.
+    Players are 0 and 1."""
+
+    SNAPSHOT = struct.Struct("<B13s13s13s13s13s")
+
+    def __init__(self, first=0):
+        self.ships = [[], []]   # ship masks of each player, in the order of FLEET
+        self.fleets = [0, 0]    # all ship cells of each player
+        self.shots = [0, 0]     # all cells each player has fired at
+        self.turn = first       # player who may fire next
+        self.winner = None
+        self.started = False    # after the first shot no ship may be moved
+
+    def place(self, player, ships):
+        """sets the fleet of player. ships: list of masks, one for each ship of FLEET"""
+        if self.started:
+            raise RuleError("the battle has already started")
+        if sorted(bin(ship).count("1") for ship in ships) != sorted(length for _, length in FLEET):
+            raise RuleError("the fleet must have ships of length " + ", ".join(str(l) for _, l in FLEET))
+        fleet = 0
+        for ship in ships:
+            if ship & fleet:
+                raise RuleError("ships must not overlap")
+            fleet |= ship
+        self.ships[player] = sorted(ships, key=lambda ship: -bin(ship).count("1"))
+        self.fleets[player] = fleet
+
+    def place_random(self, player, rng=random):
+        self.place(player, random_fleet(rng))
+
+    def ready(self):
+        return all(self.fleets)
+
+    def fire(self, player, target):
+        """player fires at cell number target. returns (result, name of the sunk ship or None)"""
+        if self.winner is not None:
+            raise RuleError("the game is over")
+        if not self.ready():
+            raise RuleError("the fleets are not placed yet")
+        if player != self.turn:
+            raise RuleError("it is not your turn")
+        bit = 1 << target
+        if self.shots[player] & bit:
+            raise RuleError("you already fired at {}".format(coordinate(target)))
+        self.started = True
+        self.shots[player] |= bit
+        enemy = 1 - player
+        if not self.fleets[enemy] & bit:
+            self.turn = enemy
+            return MISS, None
+        if not self.fleets[enemy] & ~self.shots[player]:
+            self.winner = player
+            return WON, self._ship_name(enemy, bit)
+        for (name, _), ship in zip(FLEET, self.ships[enemy]):
+            if ship & bit and ship & self.shots[player] == ship:
+                return SUNK, name   # who hits may fire again
+        return HIT, None
+
+    def _ship_name(self, player, bit):
+        for (name, _), ship in zip(FLEET, self.ships[player]):
+            if ship & bit:
+                return name
+
+    def sunk_ships(self, player):
+        """mask of all ships of player that are sunk"""
+        shots = self.shots[1 - player]
+        return sum(ship for ship in self.ships[player] if ship & shots == ship)
+
+    def snapshot(self, player):
+        """what player may know, packed into 66 bytes:
+           status (0: opponent's turn, 1: your turn, 2: you won, 3: you lost),
+           own fleet, opponent's shots, own shots, own hits, sunk opponent ships"""
+        enemy = 1 - player
+        if self.winner is None:
+            status = 1 if self.turn == player else 0
+        else:
+            status = 2 if self.winner == player else 3
+        masks = (self.fleets[player], self.shots[enemy], self.shots[player],
+                 self.shots[player] & self.fleets[enemy], self.sunk_ships(enemy))
+        return self.SNAPSHOT.pack(status, *(mask.to_bytes(13, "little") for mask in masks))
+
+
+def read_snapshot(data):
+    """inverse of Battle.snapshot: returns a dict"""
+    status, *masks = Battle.SNAPSHOT.unpack(bytes(data))
+    keys = ("fleet", "enemy_shots", "shots", "hits", "sunk")
+    result = {key: int.from_bytes(mask, "little") for key, mask in zip(keys, masks)}
+    result["status"] = status
+    return result
+
+
+def render(data):
+    """text picture of a snapshot: own board left, enemy board right"""
+    state = read_snapshot(data)
+    lines = ["    " + " ".join(COLUMNS) + "      " + " ".join(COLUMNS)]
+    for row in range(SIZE):
+        left = []
+        right = []
+        for column in range(SIZE):
+            bit = 1 << (row * SIZE + column)
+            if state["fleet"] & bit:
+                left.append("X" if state["enemy_shots"] & bit else "#")
+            else:
+                left.append("o" if state["enemy_shots"] & bit else ".")
+            if state["sunk"] & bit:
+                right.append("#")
+            elif state["hits"] & bit:
+                right.append("X")
+            else:
+                right.append("o" if state["shots"] & bit else ".")
+        lines.append("{:>2}  {}   {:>2} {}".format(row + 1, " ".join(left), row + 1, " ".join(right)))
+    lines.append(("waiting for the opponent", "your turn", "you won!", "you lost!")[state["status"]])
+    return "\n".join(lines)
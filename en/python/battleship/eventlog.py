@@ -0,0 +1,271 @@
+"""Append-only event log of the battleship server, so a restart does not lose the matches.
+
+Every match has its own log file (match_<id>.log) in the log directory.
+Each event is one record:
+
+    +----------------+---------------+----------+---------+
+    | length: 4 byte | crc32: 4 byte | kind: 1  | payload |
+    +----------------+---------------+----------+---------+
+
+The server calls EventLog.append() for every join, leave, new battle, fleet
+placement and shot. append() only puts the record into a list, it never
+touches the disk. A writer task collects all records that arrived in the
+last COMMIT_INTERVAL seconds and writes and fsyncs them in a worker thread
+(group commit): one fsync per file and batch instead of one per event, and
+the event loop never waits for the disk.
+
+Every SNAPSHOT_EVERY events of a match, the log of that match is replaced by
+one SNAPSHOT record with the complete state, so the files stay short.
+
+At startup recover() reads all logs and replays them into Match objects. A
+record that was only half written when the server died fails the crc check,
+it and everything after it is cut off.
+"""
+import asyncio
+import os
+import struct
+import time
+import zlib
+
+import engine
+import metrics
+from rooms import Match
+
+RECORD = struct.Struct("!IIB")   # payload length, crc32 of kind + payload, kind
+SHIPS = len(engine.FLEET)
+MASK_BYTES = 13                  # 100 bits
+COMMIT_INTERVAL = 0.05           # seconds
+SNAPSHOT_EVERY = 64              # events
+
+# ---- kinds of events ----
+JOIN = 1       # player index, name, \0, key of the seat
+LEAVE = 2      # player index
+BATTLE = 3     # ships of both players
+PLACE = 4      # player index, ships
+SHOT = 5       # player index, cell
+SNAPSHOT = 6   # complete state of the match, see encode_snapshot
+END = 7        # match is gone, the log file is deleted
+
+RECORDS_WRITTEN = metrics.counter("eventlog_records_total", "event records written to the match logs")
+COMMIT_TIME = metrics.histogram("eventlog_commit_microseconds", metrics.MICROSECONDS,
+                                "time to write and fsync one batch of events")
+
+
+def encode_record(kind, payload=b""):
+    return RECORD.pack(len(payload), zlib.crc32(bytes([kind]) + payload), kind) + payload
+
+
+def encode_masks(masks):
+    return b"".join(mask.to_bytes(MASK_BYTES, "little") for mask in masks)
+
+
+def decode_masks(data, count):
+    return [int.from_bytes(data[i * MASK_BYTES:(i + 1) * MASK_BYTES], "little") for i in range(count)]
+
+
+def encode_snapshot(match):
+    """names and keys, and if a battle is running: turn, winner, started, ships and shots of both players"""
+    names = "\0".join(name or "" for name in match.players + match.keys).encode("utf8")
+    battle = match.battle
+    if battle is None:
+        return b"\0" + names
+    state = bytes([1, battle.turn, 255 if battle.winner is None else battle.winner, battle.started])
+    masks = battle.ships[0] + battle.ships[1] + battle.shots
+    return state + encode_masks(masks) + names
+
+
+def decode_snapshot(match_id, payload):
+    match = Match(match_id)
+    if payload[0]:
+        battle = engine.Battle(first=payload[1])
+        masks = decode_masks(payload[4:], 2 * SHIPS + 2)
+        battle.place(0, masks[:SHIPS])
+        battle.place(1, masks[SHIPS:2 * SHIPS])
+        battle.shots = masks[2 * SHIPS:]
+        battle.winner = None if payload[2] == 255 else payload[2]
+        battle.started = bool(payload[3])
+        match.battle = battle
+        names = payload[4 + (2 * SHIPS + 2) * MASK_BYTES:]
+    else:
+        names = payload[1:]
+    names = [name or None for name in names.decode("utf8").split("\0")]
+    match.players = names[:2]
+    match.keys = names[2:] or [None, None]   # older logs have no keys
+    return match
+
+
+def read_records(path):
+    """returns the list of (kind, payload) records of one log file. a broken end is cut off"""
+    with open(path, "rb") as f:
+        data = f.read()
+    records = []
+    pos = 0
+    while pos + RECORD.size <= len(data):
+        length, crc, kind = RECORD.unpack_from(data, pos)
+        payload = data[pos + RECORD.size:pos + RECORD.size + length]
+        if len(payload) < length or zlib.crc32(bytes([kind]) + payload) != crc:
+            break
+        records.append((kind, payload))
+        pos += RECORD.size + length
+    if pos < len(data):   # the server died while writing this record
+        with open(path, "r+b") as f:
+            f.truncate(pos)
+    return records
+
+
+def replay(match_id, records):
+    """rebuilds a match from its events. returns None if nothing is left of it"""
+    match = Match(match_id)
+    for kind, payload in records:
+        if kind == SNAPSHOT:
+            match = decode_snapshot(match_id, payload)
+        elif kind == JOIN:
+            name, _, key = payload[1:].decode("utf8").partition("\0")
+            match.players[payload[0]] = name
+            match.keys[payload[0]] = key or None
+        elif kind == LEAVE:
+            match.players[payload[0]] = None
+            match.keys[payload[0]] = None
+            match.battle = None
+        elif kind == BATTLE:
+            masks = decode_masks(payload, 2 * SHIPS)
+            match.battle = engine.Battle()
+            match.battle.place(0, masks[:SHIPS])
+            match.battle.place(1, masks[SHIPS:])
+        elif kind == PLACE:
+            match.battle.place(payload[0], decode_masks(payload[1:], SHIPS))
+        elif kind == SHOT:
+            match.battle.fire(payload[0], payload[1])
+        elif kind == END:
+            return None
+    return None if match.is_empty() else match
+
+
+class EventLog:
+    """collects events of all matches and writes them with group commit"""
+
+    def __init__(self, directory, commit_interval=COMMIT_INTERVAL, snapshot_every=SNAPSHOT_EVERY):
+        self.directory = directory
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        os.makedirs(directory, exist_ok=True)
+        self._pending = []        # (match_id, kind, record) not written yet
+        self._counts = {}         # match_id: events since the last snapshot
+        self._files = {}          # match_id: open log file
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.task = None
+
+    def path(self, match_id):
+        return os.path.join(self.directory, "match_{}.log".format(match_id))
+
+    # ---- hot path: called by the server, never blocks ----
+    def append(self, match, kind, payload=b""):
+        if self._stopping:
+            return   # the server shuts down: players do not leave their matches, the log keeps them
+        self._pending.append((match.match_id, kind, encode_record(kind, payload)))
+        if kind == END:
+            self._counts.pop(match.match_id, None)
+        else:
+            count = self._counts.get(match.match_id, 0) + 1
+            if count >= self.snapshot_every:
+                self._pending.append((match.match_id, SNAPSHOT, encode_record(SNAPSHOT, encode_snapshot(match))))
+                count = 0
+            self._counts[match.match_id] = count
+        self._wakeup.set()
+
+    def join(self, match, index, name):
+        self.append(match, JOIN, bytes([index]) + "{}\0{}".format(name, match.keys[index] or "").encode("utf8"))
+
+    def leave(self, match, index):
+        self.append(match, END if match.is_empty() else LEAVE, bytes([index]))
+
+    def battle(self, match):
+        self.append(match, BATTLE, encode_masks(match.battle.ships[0] + match.battle.ships[1]))
+
+    def place(self, match, index):
+        self.append(match, PLACE, bytes([index]) + encode_masks(match.battle.ships[index]))
+
+    def shot(self, match, index, cell):
+        self.append(match, SHOT, bytes([index, cell]))
+
+    # ---- writer task ----
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._stopping:
+                await asyncio.sleep(self.commit_interval)   # let more events arrive: one fsync for all
+            batch, self._pending = self._pending, []
+            if batch:
+                await asyncio.to_thread(self._write, batch)
+            if self._stopping and not self._pending:
+                break
+        for log in self._files.values():
+            log.close()
+
+    async def close(self):
+        """writes everything that is still pending, then stops the writer task"""
+        self._stopping = True
+        self._wakeup.set()
+        if self.task is not None:
+            await asyncio.shield(self.task)
+
+    def _write(self, batch):   # runs in a worker thread
+        start = time.perf_counter()
+        touched = set()
+        for match_id, kind, record in batch:
+            if kind == SNAPSHOT:   # the snapshot replaces everything logged before
+                self._close_file(match_id)
+                temp = self.path(match_id) + ".tmp"
+                with open(temp, "wb") as f:
+                    f.write(record)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp, self.path(match_id))
+                touched.discard(match_id)
+            elif kind == END:
+                self._close_file(match_id)
+                touched.discard(match_id)
+                try:
+                    os.remove(self.path(match_id))
+                except FileNotFoundError:
+                    pass
+            else:
+                if match_id not in self._files:
+                    self._files[match_id] = open(self.path(match_id), "ab")
+                self._files[match_id].write(record)
+                touched.add(match_id)
+        for match_id in touched:
+            log = self._files[match_id]
+            log.flush()
+            os.fsync(log.fileno())
+        RECORDS_WRITTEN.inc(len(batch))
+        COMMIT_TIME.observe((time.perf_counter() - start) * 1e6)
+
+    def _close_file(self, match_id):
+        log = self._files.pop(match_id, None)
+        if log is not None:
+            log.close()
+
+    # ---- startup ----
+    def recover(self):
+        """replays all logs of the directory. returns the list of restored matches"""
+        restored = []
+        for filename in sorted(os.listdir(self.directory)):
+            if not (filename.startswith("match_") and filename.endswith(".log")):
+                continue
+            match_id = int(filename[len("match_"):-len(".log")])
+            try:
+                match = replay(match_id, read_records(os.path.join(self.directory, filename)))
+            except (engine.RuleError, IndexError, ValueError) as error:
+                print("log of match {} is damaged ({}), ignored".format(match_id, error))
+                continue
+            if match is None:
+                os.remove(os.path.join(self.directory, filename))
+            else:
+                restored.append(match)
+        return restored
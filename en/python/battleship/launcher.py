@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Starts the battleship server as several worker processes, one per cpu core.
+
+All workers listen on the same port (SO_REUSEPORT, linux and bsd only), the
+kernel spreads new connections over them. But the two players of one match
+must end up in the same worker, otherwise every shot would have to travel
+between processes. So the worker that accepted a new client only reads the
+JOIN message and then hands the socket itself (the file descriptor) to the
+launcher process. The launcher is the lobby: it knows in which worker a
+player is waiting for an opponent and passes the socket on to that worker.
+After that, all traffic of the match stays inside one process.
+
+The lobby channel between launcher and workers is a unix socket pair
+(SOCK_SEQPACKET, so every message arrives as one piece) carrying frames of
+protocol.py, and the file descriptors as ancillary data.
+
+usage: python3 launcher.py [port] [number of workers]
+"""
+import asyncio
+import multiprocessing
+import os
+import selectors
+import socket
+import sys
+
+import chat_server
+import metrics
+import protocol
+from rooms import MatchManager
+
+# ---- lobby message types (launcher <-> worker only) ----
+HANDOFF = 100   # payload: name + b"\0" + key + b"\0" + bytes already received. with one file descriptor
+SEATS = 101     # worker -> launcher, payload: number of players waiting for an opponent
+
+CHANNEL_BUFSIZ = protocol.HEADER.size + protocol.MAX_PAYLOAD
+
+
+def handoff_message(name, key, rest):
+    return protocol.encode(HANDOFF, "{}\0{}\0".format(name, key or "").encode("utf8") + rest)
+
+
+def read_message(data):
+    """a lobby message is exactly one frame"""
+    return protocol.FrameParser().feed(data)[0]
+
+
+# ---------------------------- worker process ----------------------------
+
+class ReportingMatchManager(MatchManager):
+    """tells the launcher how many players are waiting after every change"""
+
+    def __init__(self, channel, worker, workers):
+        super().__init__(first_id=worker + 1, id_step=workers,   # match ids are unique over all workers
+                         tick=chat_server.TICK)
+        self.channel = channel
+        self.worker = worker
+
+    def new_key(self):
+        return "{}.{}".format(self.worker, super().new_key())   # the lobby sends a returning player here
+
+    def join(self, conn, name, key=None):
+        result = super().join(conn, name, key)
+        self.report()
+        return result
+
+    def leave(self, match, index):
+        super().leave(match, index)
+        self.report()
+
+    def report(self):
+        self.channel.send(protocol.encode(SEATS, str(self.open_seats())))
+
+
+async def handle_new_client(reader, writer, channel):
+    """reads the JOIN, then gives the socket to the launcher"""
+    address = writer.get_extra_info("peername")
+    print("client {}:{} has connected with worker {}".format(address[0], address[1], os.getpid()))
+    joined = await chat_server.accept_join(reader, writer)   # MAX_CONNECTIONS counts per worker
+    if joined is None:
+        return
+    name, key, parser, early = joined
+    # frames that came together with the JOIN must travel with the socket
+    rest = b"".join(protocol.encode(msgtype, payload) for msgtype, payload in early) + parser.pending()
+    try:
+        message = handoff_message(name, key, rest)
+    except protocol.ProtocolError:   # flooding before the game even started
+        writer.close()
+        return
+    sock = writer.get_extra_info("socket")
+    socket.send_fds(channel, [message], [sock.fileno()])
+    writer.transport.abort()   # our copy of the socket. the launcher holds the other one
+
+
+async def adopt_client(fd, payload):
+    """a socket handed over by the launcher: the player joins a match in this worker"""
+    name, key, rest = bytes(payload).split(b"\0", 2)
+    sock = socket.socket(fileno=fd)
+    reader, writer = await asyncio.open_connection(sock=sock, limit=chat_server.BUFSIZ)
+    parser = protocol.FrameParser()
+    early = parser.feed(rest)
+    await chat_server.play(reader, writer, protocol.text(name), protocol.text(key) or None, parser, early)
+
+
+def on_channel_readable(channel, tasks):
+    msg, fds, _flags, _addr = socket.recv_fds(channel, CHANNEL_BUFSIZ, 1)
+    if not msg:   # launcher is gone
+        asyncio.get_running_loop().stop()
+        return
+    msgtype, payload = read_message(msg)
+    if msgtype == HANDOFF and fds:
+        task = asyncio.create_task(adopt_client(fds[0], payload))
+        tasks.add(task)   # keep a reference until the task is done
+        task.add_done_callback(tasks.discard)
+
+
+async def worker_main(channel, worker, workers, host, port):
+    chat_server.raise_open_file_limit()
+    chat_server.matches = ReportingMatchManager(channel, worker, workers)
+    tasks = {asyncio.create_task(chat_server.watch_connections()),
+             asyncio.create_task(metrics.REGISTRY.log_every(chat_server.STATS_INTERVAL, chat_server.STATS_LOGGED,
+                                                                "worker {} stats".format(worker)))}
+    asyncio.get_running_loop().add_reader(channel.fileno(), on_channel_readable, channel, tasks)
+    server = await asyncio.start_server(lambda r, w: handle_new_client(r, w, channel),
+                                        host, port, backlog=chat_server.BACKLOG, reuse_port=True)
+    async with server:
+        await server.serve_forever()
+
+
+def run_worker(channel, worker, workers, host, port):
+    try:
+        asyncio.run(worker_main(channel, worker, workers, host, port))
+    except (KeyboardInterrupt, RuntimeError):   # RuntimeError: loop stopped by on_channel_readable
+        pass
+
+
+# ---------------------------- launcher (lobby) ----------------------------
+
+class Lobby:
+    """knows how many players wait for an opponent in each worker and routes new players"""
+
+    def __init__(self, channels):
+        self.channels = channels           # one unix socket per worker, None when the worker died
+        self.seats = [0] * len(channels)   # players waiting for an opponent, per worker
+
+    def drop(self, worker):
+        """a worker died: no more players are sent there"""
+        if self.channels[worker] is not None:
+            print("worker {} is gone".format(worker))
+        self.channels[worker] = None
+        self.seats[worker] = 0
+
+    def route(self, origin, key=""):
+        """returns the worker for a new player that connected to worker origin, None if all workers died.
+           a player with the key of a seat (see ReportingMatchManager.new_key) goes back to its worker"""
+        owner, _, _ = key.partition(".")
+        if owner.isdigit() and int(owner) < len(self.channels) and self.channels[int(owner)] is not None:
+            return int(owner)
+        if self.seats[origin] > 0:
+            target = origin   # no need to move the socket to another process
+        else:
+            target = next((w for w, seats in enumerate(self.seats) if seats > 0), origin)
+        if self.channels[target] is None:   # origin died after it sent the player
+            target = next((w for w, channel in enumerate(self.channels) if channel is not None), None)
+            if target is None:
+                return None
+        # the worker will report the exact number soon, until then we guess:
+        if self.seats[target] > 0:
+            self.seats[target] -= 1   # player takes the free seat
+        else:
+            self.seats[target] += 1   # new match, player waits there
+        return target
+
+    def hand_over(self, origin, msg, payload, fds):
+        """sends the player to a worker, to another one if the first has died"""
+        key = protocol.text(bytes(payload).split(b"\0", 2)[1])
+        while True:
+            target = self.route(origin, key)
+            if target is None:
+                print("no worker left for a new player")
+                return
+            try:
+                socket.send_fds(self.channels[target], [msg], fds)
+                return
+            except OSError:   # BrokenPipeError, ConnectionResetError: worker died
+                self.drop(target)
+
+    def on_message(self, origin):
+        try:
+            msg, fds, _flags, _addr = socket.recv_fds(self.channels[origin], CHANNEL_BUFSIZ, 1)
+        except OSError:
+            return False
+        if not msg:
+            return False   # worker died
+        msgtype, payload = read_message(msg)
+        if msgtype == SEATS:
+            self.seats[origin] = int(protocol.text(payload))
+        elif msgtype == HANDOFF and fds:
+            self.hand_over(origin, msg, payload, fds)
+        for fd in fds:
+            os.close(fd)   # the target worker has its own copy now
+        return True
+
+    def run(self):
+        selector = selectors.DefaultSelector()
+        for index, channel in enumerate(self.channels):
+            selector.register(channel, selectors.EVENT_READ, index)
+        alive = len(self.channels)
+        while alive:
+            for key, _events in selector.select():
+                # a worker dropped by hand_over still gets here once, its channel is readable (closed)
+                if self.channels[key.data] is None or not self.on_message(key.data):
+                    self.drop(key.data)
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+                    alive -= 1
+
+
+def main(host, port, workers):
+    if not hasattr(socket, "SO_REUSEPORT"):
+        sys.exit("SO_REUSEPORT is not available on this system, use chat_server.py instead")
+    channels = []
+    processes = []
+    for worker in range(workers):
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        process = multiprocessing.Process(target=run_worker, args=(theirs, worker, workers, host, port), daemon=True)
+        process.start()
+        theirs.close()
+        channels.append(ours)
+        processes.append(process)
+    print("{} workers listening on port {}".format(workers, port))
+    try:
+        Lobby(channels).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+    print("server stopped")
+
+
+if __name__ == "__main__":
+    PORT = int(sys.argv[1]) if len(sys.argv) > 1 else chat_server.PORT
+    WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count()
+    main(chat_server.HOST, PORT, WORKERS)
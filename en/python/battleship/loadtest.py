@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Load test for the battleship server: many simulated players in one process.
+
+Every simulated player connects, joins a match and then sends chat messages
+and shots at a fixed rate. Chat messages carry the time they were sent; the
+server broadcasts them back to the sender too, so the round trip time of a
+broadcast can be measured when the message comes back.
+
+start a server first (python3 chat_server.py 33000), then for example:
+    python3 loadtest.py --clients 2000 --duration 30 --chat-rate 1 --shot-rate 0.2
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import chat_server
+import protocol
+
+MARKER = "lt:"   # chat messages of the load test: lt:<client>:<send time in ns>
+
+
+class Stats:
+    """everything the load test measures"""
+
+    def __init__(self):
+        self.connect_times = []   # seconds
+        self.round_trips = []     # seconds, from sending a chat until it comes back
+        self.sent = 0             # frames
+        self.received = 0         # frames
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = {}          # kind of error: count
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+def percentile(values, p):
+    """p-th percentile (0..100) of values, nearest rank"""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))
+    return values[index]
+
+
+async def receive(reader, writer, stats, me):
+    parser = protocol.FrameParser()
+    while True:
+        data = await reader.read(chat_server.BUFSIZ)
+        if not data:
+            return
+        now = time.perf_counter_ns()
+        stats.bytes_received += len(data)
+        for msgtype, payload in parser.feed(data):
+            stats.received += 1
+            if msgtype == protocol.QUIT:
+                return
+            if msgtype == protocol.PING:
+                writer.write(protocol.pong())
+            elif msgtype == protocol.CHAT:
+                message = protocol.text(payload)
+                position = message.find(MARKER)
+                if position >= 0:
+                    _, client, sent = message[position:].split(":")
+                    if int(client) == me:
+                        stats.round_trips.append((now - int(sent)) / 1e9)
+
+
+async def player(me, args, stats, stop):
+    """one simulated player"""
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+    except OSError:
+        stats.error("connect")
+        return
+    stats.connect_times.append(time.perf_counter() - start)
+
+    def send(frame):
+        writer.write(frame)
+        stats.sent += 1
+        stats.bytes_sent += len(frame)
+
+    receiver = asyncio.create_task(receive(reader, writer, stats, me))
+    send(protocol.join("bot{}".format(me)))
+    rate = args.chat_rate + args.shot_rate
+    try:
+        while not stop.is_set() and not receiver.done():
+            if rate <= 0:
+                await stop.wait()
+                break
+            try:   # poisson process; a pending pause ends as soon as stop is set
+                await asyncio.wait_for(stop.wait(), random.expovariate(rate))
+                break
+            except asyncio.TimeoutError:
+                pass
+            if random.random() * rate < args.chat_rate:
+                send(protocol.chat("{}{}:{}".format(MARKER, me, time.perf_counter_ns())))
+            else:
+                send(protocol.shot(random.choice("ABCDEFGHIJ") + str(random.randint(1, 10))))
+            await writer.drain()
+        if receiver.done():
+            stats.error("disconnected by server")
+        else:
+            send(protocol.quit())
+            await writer.drain()
+    except (ConnectionError, protocol.ProtocolError):
+        stats.error("connection lost")
+    finally:
+        receiver.cancel()
+        writer.close()
+
+
+async def run(args):
+    chat_server.raise_open_file_limit()
+    stats = Stats()
+    stop = asyncio.Event()
+    tasks = []
+    for me in range(args.clients):
+        tasks.append(asyncio.create_task(player(me, args, stats, stop)))
+        if args.ramp:
+            await asyncio.sleep(1 / args.ramp)   # new connections per second
+    started = time.perf_counter()
+    await asyncio.sleep(args.duration)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return stats, elapsed
+
+
+def report(stats, elapsed):
+    print("connections: {}   errors: {}".format(len(stats.connect_times), stats.errors or "none"))
+    print("connect time ms   p50 {:8.2f}  p90 {:8.2f}  p99 {:8.2f}  max {:8.2f}".format(
+        *(1000 * percentile(stats.connect_times, p) for p in (50, 90, 99, 100))))
+    print("round trip ms     p50 {:8.2f}  p90 {:8.2f}  p99 {:8.2f}  max {:8.2f}   ({} samples)".format(
+        *(1000 * percentile(stats.round_trips, p) for p in (50, 90, 99, 100)), len(stats.round_trips)))
+    print("sent      {:9} frames {:7.0f}/s  {:10.0f} bytes/s".format(
+        stats.sent, stats.sent / elapsed, stats.bytes_sent / elapsed))
+    print("received  {:9} frames {:7.0f}/s  {:10.0f} bytes/s".format(
+        stats.received, stats.received / elapsed, stats.bytes_received / elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="load test for the battleship server (localhost)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=chat_server.PORT)
+    parser.add_argument("-n", "--clients", type=int, default=100, help="number of simulated players")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="seconds of sending, after all clients are started")
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="chat messages per second and player")
+    parser.add_argument("--shot-rate", type=float, default=0.2, help="shots per second and player")
+    parser.add_argument("--ramp", type=float, default=0, help="new connections per second (0: all at once)")
+    args = parser.parse_args()
+    report(*asyncio.run(run(args)))
@@ -0,0 +1,168 @@
+"""Metrics of the battleship server: counters, gauges and histograms.
+
+Cheap enough to stay switched on:
+  * a Counter is a list of one number per thread. inc() only touches the
+    number of the calling thread, no lock is needed. Reading the counter
+    adds up the numbers of all threads.
+  * a Gauge is a function that is only called when the metrics are read,
+    for example the number of matches. it costs nothing in between.
+  * a Histogram counts values in fixed buckets, also one list per thread.
+
+REGISTRY.text() returns all metrics as plain text (one "name value" per
+line), serve() answers every connection on the stats port with that text
+(http or plain tcp: curl http://127.0.0.1:33001 or nc 127.0.0.1 33001), and
+log_every() prints a short summary line at a fixed interval.
+"""
+import asyncio
+import bisect
+import threading
+import time
+
+
+class Counter:
+    def __init__(self, name, help=""):
+        self.name = name
+        self.help = help
+        self._local = threading.local()
+        self._cells = []                # [value] of every thread that counted
+        self._lock = threading.Lock()   # only used when a thread counts the first time
+
+    def inc(self, amount=1):
+        try:
+            self._local.cell[0] += amount
+        except AttributeError:   # first time for this thread
+            cell = [amount]
+            self._local.cell = cell
+            with self._lock:
+                self._cells.append(cell)
+
+    @property
+    def value(self):
+        return sum(cell[0] for cell in list(self._cells))
+
+    def lines(self):
+        yield "{} {}".format(self.name, self.value)
+
+
+class Gauge:
+    def __init__(self, name, function, help=""):
+        self.name = name
+        self.help = help
+        self.function = function   # called only when the gauge is read
+
+    @property
+    def value(self):
+        return self.function()
+
+    def lines(self):
+        yield "{} {}".format(self.name, self.value)
+
+
+class Histogram:
+    """counts values in buckets: bounds[i-1] < value <= bounds[i], the last bucket is everything above"""
+
+    def __init__(self, name, bounds, help=""):
+        self.name = name
+        self.help = help
+        self.bounds = list(bounds)
+        self._local = threading.local()
+        self._cells = []                # [bucket counts..., sum] of every thread
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        try:
+            cell = self._local.cell
+        except AttributeError:
+            cell = [0] * (len(self.bounds) + 2)
+            self._local.cell = cell
+            with self._lock:
+                self._cells.append(cell)
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def buckets(self):
+        """returns (counts per bucket, sum of all values), all threads together"""
+        counts = [0] * (len(self.bounds) + 1)
+        total = 0
+        for cell in list(self._cells):
+            for i in range(len(counts)):
+                counts[i] += cell[i]
+            total += cell[-1]
+        return counts, total
+
+    def percentile(self, p):
+        """upper bound of the bucket that contains the p-th percentile (0..100)"""
+        counts, _ = self.buckets()
+        rank = sum(counts) * p / 100
+        seen = 0
+        for bound, count in zip(self.bounds + [float("inf")], counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return 0
+
+    def lines(self):
+        counts, total = self.buckets()
+        seen = 0
+        for bound, count in zip(self.bounds + ["+Inf"], counts):
+            seen += count
+            yield '{}_bucket{{le="{}"}} {}'.format(self.name, bound, seen)
+        yield "{}_count {}".format(self.name, seen)
+        yield "{}_sum {:.1f}".format(self.name, total)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}   # name: metric
+        self.started = time.time()
+
+    def _add(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError("metric {} exists already".format(metric.name))
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help=""):
+        return self._add(Counter(name, help))
+
+    def gauge(self, name, function, help=""):
+        return self._add(Gauge(name, function, help))
+
+    def histogram(self, name, bounds, help=""):
+        return self._add(Histogram(name, bounds, help))
+
+    def text(self):
+        lines = ["uptime_seconds {:.0f}".format(time.time() - self.started)]
+        for metric in self.metrics.values():
+            if metric.help:
+                lines.append("# HELP {} {}".format(metric.name, metric.help))
+            lines.extend(metric.lines())
+        return "\n".join(lines) + "\n"
+
+    async def serve(self, host, port):
+        """answers every connection with the metrics as text, then closes it"""
+        async def answer(reader, writer):
+            try:
+                await asyncio.wait_for(reader.read(4096), 1)   # the http request, if any
+            except (asyncio.TimeoutError, OSError):
+                pass
+            body = self.text().encode("utf8")
+            writer.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body)
+            writer.close()
+        return await asyncio.start_server(answer, host, port)
+
+    async def log_every(self, seconds, names, title="stats"):
+        """prints one line with the metrics in names every few seconds"""
+        while True:
+            await asyncio.sleep(seconds)
+            print(title + ": " + "  ".join("{}={}".format(name, self.metrics[name].value) for name in names))
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+# buckets for durations in microseconds: 1 2 5 10 20 50 ... 1000000
+MICROSECONDS = [m * 10 ** e for e in range(7) for m in (1, 2, 5)][:19]
@@ -0,0 +1,178 @@
+"""Wire protocol for the battleship chat.
+
+TCP is a stream, not a sequence of messages: one recv() can return several
+messages glued together or only half of one. Therefore every message is sent
+as a frame:
+
+    +----------------+----------+-----------------+
+    | length: 4 byte | type: 1  | payload: length |
+    +----------------+----------+-----------------+
+
+length is the payload length (unsigned, big endian), type is one of the
+constants below, the payload is utf8 text (or empty).
+FrameParser collects the received bytes and cuts them into frames.
+"""
+import re
+import struct
+
+HEADER = struct.Struct("!IB")   # payload length, message type
+MAX_PAYLOAD = 64 * 1024         # larger frames are garbage or an attack
+
+# ---- message types ----
+JOIN = 1    # client -> server: nickname
+CHAT = 2    # both directions: chat text
+SHOT = 3    # client -> server: coordinate like "A2". server -> clients: shot report
+QUIT = 4    # both directions: no payload
+INFO = 5    # server -> client: server notice
+PLACE = 6   # client -> server: own fleet like "A1-A5 C1-C4 E1-E3 G1-G3 I1-I2"
+STATE = 7   # server -> client: binary snapshot of the battle, see engine.Battle.snapshot
+PING = 8    # both directions: are you still there? must be answered with PONG
+PONG = 9    # both directions: no payload
+TICK = 10   # client -> server: ticks per second of the own match, like "30". "0": every frame is sent at once
+KEY = 11    # server -> client: secret of the own seat. a JOIN with this key gets the seat back after a lost connection
+
+NAMES = {JOIN: "join", CHAT: "chat", SHOT: "shot", QUIT: "quit", INFO: "info",
+         PLACE: "place", STATE: "state", PING: "ping", PONG: "pong", TICK: "tick", KEY: "key"}
+
+COORDINATE = re.compile(r"^[A-Ja-j](10|[1-9])$")
+
+
+class ProtocolError(Exception):
+    """the other side sent something that is not a valid frame"""
+
+
+def encode(msgtype, payload=b""):
+    """returns one frame (bytes) for msgtype with payload (bytes or str)"""
+    if isinstance(payload, str):
+        payload = payload.encode("utf8")
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError("payload too large: {} bytes".format(len(payload)))
+    return HEADER.pack(len(payload), msgtype) + payload
+
+
+def text(payload):
+    """decodes the payload of a frame (bytes or memoryview) into a str"""
+    return str(payload, "utf8", "replace")
+
+
+# ---- typed messages ----
+def join(name, key=None):
+    """key: the secret of a KEY message, to get the old seat back"""
+    return encode(JOIN, name if key is None else name + "\0" + key)
+
+
+def parse_join(payload):
+    """returns (name, key) of a JOIN payload. key is None for a player who wants a new seat"""
+    name, _, key = text(payload).partition("\0")
+    return name, key or None
+
+
+def chat(message):
+    return encode(CHAT, message)
+
+
+def shot(coordinate):
+    return encode(SHOT, coordinate.upper())
+
+
+def quit():
+    return encode(QUIT)
+
+
+def info(message):
+    return encode(INFO, message)
+
+
+def place(fleet):
+    return encode(PLACE, fleet)
+
+
+def state(snapshot):
+    return encode(STATE, snapshot)
+
+
+def ping():
+    return encode(PING)
+
+
+def pong():
+    return encode(PONG)
+
+
+def tick(rate):
+    return encode(TICK, str(rate))
+
+
+def key(secret):
+    return encode(KEY, secret)
+
+
+def from_user_input(line):
+    """turns a line typed by the player into a frame: quit, place, tick, shot or chat"""
+    line = line.strip()
+    if line.lower() == "quit":
+        return quit()
+    if line.lower().startswith("place "):
+        return place(line[6:])
+    if line.lower().startswith("tick ") and line[5:].strip().isdigit():
+        return tick(line[5:].strip())
+    if COORDINATE.match(line):
+        return shot(line)
+    return chat(line)
+
+
+class FrameParser:
+    """Cuts a stream of received bytes into frames.
+
+    feed() returns a list of (msgtype, payload) tuples. payload is a memoryview
+    into the received data, so no bytes are copied for frames that arrive in
+    one piece. Only a frame that is split between two reads is copied into an
+    internal buffer until it is complete."""
+
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        self.max_payload = max_payload
+        self._partial = bytearray()   # beginning of an unfinished frame
+
+    def _payload_length(self, data, offset=0):
+        length = HEADER.unpack_from(data, offset)[0]
+        if length > self.max_payload:
+            raise ProtocolError("frame too large: {} bytes".format(length))
+        return length
+
+    def feed(self, data):
+        """data: bytes from recv(). returns list of complete (msgtype, payload) frames"""
+        frames = []
+        view = memoryview(data)
+        end = len(view)
+        pos = 0
+        # --- first finish a frame that was split by the previous read ---
+        while self._partial and pos < end:
+            if len(self._partial) < HEADER.size:
+                wanted = HEADER.size
+            else:
+                wanted = HEADER.size + self._payload_length(self._partial)
+            take = min(wanted - len(self._partial), end - pos)
+            self._partial += view[pos:pos + take]
+            pos += take
+            if len(self._partial) >= HEADER.size:
+                length = self._payload_length(self._partial)
+                if len(self._partial) == HEADER.size + length:
+                    frame = bytes(self._partial)
+                    self._partial.clear()
+                    frames.append((frame[HEADER.size - 1], memoryview(frame)[HEADER.size:]))
+        # --- complete frames: slices of data, no copy ---
+        while end - pos >= HEADER.size:
+            length = self._payload_length(view, pos)
+            start = pos + HEADER.size
+            if end - start < length:
+                break
+            frames.append((view[pos + HEADER.size - 1], view[start:start + length]))
+            pos = start + length
+        # --- keep the rest for the next read ---
+        if pos < end:
+            self._partial += view[pos:]
+        return frames
+
+    def pending(self):
+        """returns the bytes of the unfinished frame (received, but not complete yet)"""
+        return bytes(self._partial)
@@ -0,0 +1,178 @@
+"""Matches (rooms) of the battleship server.
+
+Every match has its own two player slots, its own battle and its own
+list of connections, so a broadcast inside a match only touches the two
+players of that match, no matter how many clients are connected to the
+server. The MatchManager puts new players into matches and finds a match by
+its id.
+
+A match can have a tick: then the frames for its players are not sent at
+once, but collected and sent tick times per second, all frames of one player
+glued together into one write (frames are self-delimiting, the client does
+not notice). Many small packets and send() calls become one per tick.
+Latency-sensitive matches set the tick to 0 and send every frame at once.
+The timer only runs while something is waiting, an idle match costs nothing.
+
+Every seat has a secret key, a new one for every join. A player who lost his
+connection in the middle of a battle (or whose server restarted) gets his
+seat and the battle back when he joins again with that key. The name is not
+enough, anybody can choose any name.
+"""
+import asyncio
+import collections
+import secrets
+
+KEY_BYTES = 16
+
+
+class Match:
+    """one game of battleship: two players, their connections and the battle"""
+
+    def __init__(self, match_id, tick=0):
+        self.match_id = match_id
+        self.players = [None, None]       # names
+        self.connections = [None, None]   # Connection objects, None while a seat waits for its player
+        self.keys = [None, None]          # secret of each seat, see MatchManager.hold
+        self.battle = None                # engine.Battle, while both seats are taken
+        self.waiting = False              # True while listed in MatchManager.waiting
+        self.tick = tick                  # flushes per second, 0: frames are sent at once
+        self._timer = None                # pending flush
+
+    def free_slot(self):
+        """returns the index of a free player slot or None if the match is full"""
+        for index, name in enumerate(self.players):
+            if name is None:
+                return index
+        return None
+
+    def is_full(self):
+        return self.free_slot() is None
+
+    def is_empty(self):
+        return self.players == [None, None]
+
+    def broadcast(self, frame):
+        """sends an already encoded frame to every player of this match"""
+        for conn in self.connections:
+            if conn is not None:
+                conn.send(frame)
+
+    def seat(self, index, conn):
+        """puts conn (or None) into the player slot index"""
+        self.connections[index] = conn
+        if conn is not None:
+            conn.ticker = self if self.tick else None
+
+    def set_tick(self, tick):
+        """changes the tick of this match. 0 sends every frame at once"""
+        self.tick = tick
+        self.flush()   # what was collected with the old tick goes out now
+        for conn in self.connections:
+            if conn is not None:
+                conn.ticker = self if tick else None
+
+    def wake(self):
+        """called by a Connection when it has frames for the next tick"""
+        if self._timer is None and self.tick:
+            self._timer = asyncio.get_running_loop().call_later(1 / self.tick, self.flush)
+
+    def flush(self):
+        """sends everything the players of this match have collected since the last tick"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for conn in self.connections:
+            if conn is not None:
+                conn.flush()
+
+
+class MatchManager:
+    """assigns players to matches, keeps all running matches indexed by match id"""
+
+    def __init__(self, first_id=1, id_step=1, tick=0):   # several managers (processes) need different ids
+        self.matches = {}                   # match_id: Match
+        self.waiting = collections.deque()  # ids of matches with a free slot
+        self.reserved = {}                  # key: match_id, seats that wait for their player
+        self.next_id = first_id
+        self.id_step = id_step
+        self.tick = tick                    # tick of new matches
+
+    def join(self, conn, name, key=None):
+        """puts a player into the first match with a free slot (or a new match).
+           with the key of a seat that waits for him, the player gets that seat back.
+           returns (match, index of the player inside the match)"""
+        if key in self.reserved:
+            match = self.matches.get(self.reserved.pop(key))
+            if match is not None and key in match.keys:
+                index = match.keys.index(key)
+                if match.connections[index] is None:
+                    self._sit(match, index, name, conn)
+                    return match, index
+        match = None
+        while self.waiting:
+            candidate = self.matches.get(self.waiting[0])
+            if candidate is not None and not candidate.is_full():
+                match = candidate
+                break
+            self._pop_waiting()   # match is gone or full meanwhile
+        if match is None:
+            match = Match(self.next_id, self.tick)
+            self.next_id += self.id_step
+            self.matches[match.match_id] = match
+            self._push_waiting(match)
+        index = match.free_slot()
+        self._sit(match, index, name, conn)
+        if match.is_full():
+            self._pop_waiting()
+        return match, index
+
+    def restore(self, match):
+        """adds a match recovered after a restart. its players get their seats back when they join with their key"""
+        self.matches[match.match_id] = match
+        match.tick = self.tick
+        while self.next_id <= match.match_id:
+            self.next_id += self.id_step
+        for key in match.keys:
+            if key is not None:
+                self.reserved[key] = match.match_id
+        if not match.is_full():
+            self._push_waiting(match)
+
+    def open_seats(self):
+        """number of matches where a player is waiting for an opponent"""
+        return sum(1 for match_id in self.waiting
+                   if match_id in self.matches and not self.matches[match_id].is_full())
+
+    def hold(self, match, index):
+        """the player lost his connection: the seat stays his until he comes back with its key (or leaves)"""
+        match.seat(index, None)
+        if match.keys[index] is not None:
+            self.reserved[match.keys[index]] = match.match_id
+
+    def leave(self, match, index):
+        """frees the slot of a player. empty matches are removed"""
+        self.reserved.pop(match.keys[index], None)
+        match.players[index] = None
+        match.keys[index] = None
+        match.seat(index, None)
+        if match.is_empty():
+            del self.matches[match.match_id]
+        elif not match.waiting:
+            self._push_waiting(match)   # somebody else may take the seat
+
+    def _sit(self, match, index, name, conn):
+        match.players[index] = name
+        match.keys[index] = self.new_key()   # new for every join, an old key is worthless
+        match.seat(index, conn)
+
+    def new_key(self):
+        return secrets.token_hex(KEY_BYTES)
+
+    def _push_waiting(self, match):
+        match.waiting = True
+        self.waiting.append(match.match_id)
+
+    def _pop_waiting(self):
+        match = self.matches.get(self.waiting.popleft())
+        if match is not None:
+            match.waiting = False
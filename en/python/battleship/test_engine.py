@@ -0,0 +1,108 @@
+"""unit tests for the battleship rules (engine.py). run: python3 -m pytest (or python3 -m unittest)"""
+import random
+import unittest
+
+import engine
+
+FLEET_TEXT = "A1-A5 C1-C4 E1-E3 G1-G3 I1-I2"
+FLEET_CELLS = [engine.cell(c) for c in "A1 A2 A3 A4 A5 C1 C2 C3 C4 E1 E2 E3 G1 G2 G3 I1 I2".split()]
+
+
+class CoordinateTest(unittest.TestCase):
+
+    def test_cell_and_coordinate(self):
+        self.assertEqual(engine.cell("A1"), 0)
+        self.assertEqual(engine.cell("a2"), 10)
+        self.assertEqual(engine.cell("J10"), 99)
+        for number in range(100):
+            self.assertEqual(engine.cell(engine.coordinate(number)), number)
+
+    def test_bad_coordinates(self):
+        for text in ("", "K1", "A0", "A11", "1A", "AA"):
+            with self.assertRaises(engine.RuleError):
+                engine.cell(text)
+
+    def test_cells_of_mask(self):
+        self.assertEqual(list(engine.cells(0)), [])
+        self.assertEqual(list(engine.cells(1 << 0 | 1 << 42 | 1 << 99)), [0, 42, 99])
+
+
+class ShipTest(unittest.TestCase):
+
+    def test_ship_mask(self):
+        self.assertEqual(engine.ship_mask(engine.cell("A1"), engine.cell("C1")), 0b111)
+        vertical = engine.ship_mask(engine.cell("B3"), engine.cell("B1"))   # the order of the ends does not matter
+        self.assertEqual(list(engine.cells(vertical)), [1, 11, 21])
+        with self.assertRaises(engine.RuleError):
+            engine.ship_mask(engine.cell("A1"), engine.cell("B2"))
+
+    def test_placements(self):
+        for length, placements in engine.PLACEMENTS.items():
+            self.assertEqual(len(placements), 2 * 10 * (10 - length + 1))
+            self.assertEqual(len(set(placements)), len(placements))
+            for ship in placements:
+                self.assertEqual(bin(ship).count("1"), length)
+
+    def test_random_fleet(self):
+        rng = random.Random(1)
+        for _ in range(50):
+            ships = engine.random_fleet(rng)
+            battle = engine.Battle()
+            battle.place(0, ships)   # raises if the fleet breaks the rules
+            self.assertEqual(bin(battle.fleets[0]).count("1"), 17)
+
+
+class BattleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.battle = engine.Battle()
+        self.battle.place(0, engine.parse_fleet(FLEET_TEXT))
+        self.battle.place(1, engine.parse_fleet(FLEET_TEXT))
+
+    def test_place_checks_the_fleet(self):
+        battle = engine.Battle()
+        with self.assertRaises(engine.RuleError):
+            battle.place(0, engine.parse_fleet("A1-A5 C1-C4 E1-E3 G1-G3"))   # a ship is missing
+        with self.assertRaises(engine.RuleError):
+            battle.place(0, engine.parse_fleet("A1-A5 A1-D1 E1-E3 G1-G3 I1-I2"))   # overlap
+
+    def test_turns(self):
+        with self.assertRaises(engine.RuleError):
+            self.battle.fire(1, 0)   # player 0 begins
+        self.assertEqual(self.battle.fire(0, engine.cell("J10")), (engine.MISS, None))
+        self.assertEqual(self.battle.turn, 1)
+        self.assertEqual(self.battle.fire(1, engine.cell("A1")), (engine.HIT, None))
+        self.assertEqual(self.battle.turn, 1)   # who hits may fire again
+        with self.assertRaises(engine.RuleError):
+            self.battle.fire(1, engine.cell("A1"))   # twice at the same cell
+
+    def test_no_placing_after_the_first_shot(self):
+        self.battle.fire(0, engine.cell("J10"))
+        with self.assertRaises(engine.RuleError):
+            self.battle.place(0, engine.parse_fleet(FLEET_TEXT))
+
+    def test_sunk_and_won(self):
+        results = [self.battle.fire(0, target) for target in FLEET_CELLS]
+        self.assertEqual(results[4], (engine.SUNK, "carrier"))
+        self.assertEqual(results[8], (engine.SUNK, "battleship"))
+        self.assertEqual(results[-1], (engine.WON, "destroyer"))
+        self.assertEqual(self.battle.winner, 0)
+        with self.assertRaises(engine.RuleError):
+            self.battle.fire(0, engine.cell("J10"))
+
+    def test_snapshot(self):
+        self.battle.fire(0, engine.cell("A1"))
+        self.battle.fire(0, engine.cell("J10"))
+        mine = engine.read_snapshot(self.battle.snapshot(0))
+        theirs = engine.read_snapshot(self.battle.snapshot(1))
+        self.assertEqual(mine["status"], 0)   # player 0 missed, now it is the turn of player 1
+        self.assertEqual(theirs["status"], 1)
+        self.assertEqual(mine["shots"], 1 << 0 | 1 << 99)
+        self.assertEqual(mine["hits"], 1 << 0)
+        self.assertEqual(theirs["enemy_shots"], mine["shots"])
+        self.assertEqual(theirs["fleet"], self.battle.fleets[1])
+        self.assertEqual(len(self.battle.snapshot(0)), 66)
+
+
+if __name__ == "__main__":
+    unittest.main()
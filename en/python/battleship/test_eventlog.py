@@ -0,0 +1,110 @@
+"""unit tests for the event log and its crash recovery (eventlog.py). run: python3 -m pytest (or python3 -m unittest)"""
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import engine
+import eventlog
+from rooms import Match
+
+FLEET = engine.parse_fleet("A1-A5 C1-C4 E1-E3 G1-G3 I1-I2")
+
+
+def running_match(match_id=7):
+    """a match with two players and a battle that has started"""
+    match = Match(match_id)
+    match.players = ["alice", "bob"]
+    match.keys = ["key0", "key1"]
+    match.battle = engine.Battle()
+    match.battle.place(0, FLEET)
+    match.battle.place(1, FLEET)
+    match.battle.fire(0, engine.cell("A1"))
+    match.battle.fire(0, engine.cell("J10"))
+    return match
+
+
+class LogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "match_7.log")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, *records):
+        with open(self.path, "ab") as f:
+            for kind, payload in records:
+                f.write(eventlog.encode_record(kind, payload))
+
+    def assertSameMatch(self, restored, match):
+        self.assertEqual(restored.players, match.players)
+        self.assertEqual(restored.keys, match.keys)
+        for name in ("ships", "fleets", "shots", "turn", "winner", "started"):
+            self.assertEqual(getattr(restored.battle, name), getattr(match.battle, name), name)
+
+    def test_records(self):
+        self.write((eventlog.JOIN, b"\0alice\0k"), (eventlog.LEAVE, b"\0"))
+        self.assertEqual(eventlog.read_records(self.path), [(eventlog.JOIN, b"\0alice\0k"), (eventlog.LEAVE, b"\0")])
+
+    def test_half_written_record_is_cut_off(self):
+        self.write((eventlog.JOIN, b"\0alice\0k"))
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as f:
+            f.write(eventlog.encode_record(eventlog.JOIN, b"\1bob\0k")[:-2])   # the server died here
+        self.assertEqual(eventlog.read_records(self.path), [(eventlog.JOIN, b"\0alice\0k")])
+        self.assertEqual(os.path.getsize(self.path), size)   # the broken end is gone from the file
+
+    def test_crc(self):
+        self.write((eventlog.JOIN, b"\0alice\0k"), (eventlog.JOIN, b"\1bob\0k"), (eventlog.LEAVE, b"\0"))
+        with open(self.path, "r+b") as f:
+            f.seek(eventlog.RECORD.size + len(b"\0alice\0k") + eventlog.RECORD.size + 1)
+            f.write(b"B")   # one flipped byte in the second record
+        self.assertEqual(eventlog.read_records(self.path), [(eventlog.JOIN, b"\0alice\0k")])
+
+    def test_replay(self):
+        match = running_match()
+        records = [(eventlog.JOIN, b"\0alice\0key0"), (eventlog.JOIN, b"\1bob\0key1"),
+                   (eventlog.BATTLE, eventlog.encode_masks(FLEET + FLEET)),
+                   (eventlog.SHOT, bytes([0, engine.cell("A1")])), (eventlog.SHOT, bytes([0, engine.cell("J10")]))]
+        self.assertSameMatch(eventlog.replay(7, records), match)
+        self.assertIsNone(eventlog.replay(7, records + [(eventlog.END, b"\0")]))
+        left = eventlog.replay(7, records + [(eventlog.LEAVE, b"\1")])
+        self.assertEqual((left.players, left.keys, left.battle), (["alice", None], ["key0", None], None))
+
+    def test_snapshot(self):
+        match = running_match()
+        restored = eventlog.decode_snapshot(7, eventlog.encode_snapshot(match))
+        self.assertSameMatch(restored, match)
+        match.battle = None
+        restored = eventlog.decode_snapshot(7, eventlog.encode_snapshot(match))
+        self.assertEqual((restored.players, restored.keys, restored.battle), (match.players, match.keys, None))
+
+    def test_write_and_recover(self):
+        async def play():
+            log = eventlog.EventLog(self.directory, commit_interval=0, snapshot_every=3)
+            log.start()
+            match = Match(7)
+            match.players = ["alice", "bob"]
+            match.keys = ["key0", "key1"]
+            match.battle = engine.Battle()
+            log.join(match, 0, "alice")
+            log.join(match, 1, "bob")
+            match.battle.place(0, FLEET)
+            match.battle.place(1, FLEET)
+            log.battle(match)   # the third event: the log is replaced by a snapshot
+            for target in ("A1", "J10"):
+                match.battle.fire(0, engine.cell(target))
+                log.shot(match, 0, engine.cell(target))
+            await log.close()
+            return match
+        match = asyncio.run(play())
+        restored, = eventlog.EventLog(self.directory).recover()
+        self.assertEqual(restored.match_id, 7)
+        self.assertSameMatch(restored, match)
+
+
+if __name__ == "__main__":
+    unittest.main()
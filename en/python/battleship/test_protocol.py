@@ -0,0 +1,78 @@
+"""unit tests for the frames of protocol.py. run: python3 -m pytest (or python3 -m unittest)"""
+import unittest
+
+import protocol
+
+
+def frames(parser, data):
+    return [(msgtype, bytes(payload)) for msgtype, payload in parser.feed(data)]
+
+
+class EncodeTest(unittest.TestCase):
+
+    def test_encode(self):
+        self.assertEqual(protocol.encode(protocol.CHAT, "hi"), b"\0\0\0\x02\x02hi")
+        self.assertEqual(protocol.quit(), b"\0\0\0\0\x04")
+        self.assertEqual(protocol.encode(protocol.CHAT, "ä"), b"\0\0\0\x02\x02\xc3\xa4")   # length in bytes
+
+    def test_payload_too_large(self):
+        protocol.encode(protocol.CHAT, b"x" * protocol.MAX_PAYLOAD)
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.encode(protocol.CHAT, b"x" * (protocol.MAX_PAYLOAD + 1))
+
+    def test_join(self):
+        self.assertEqual(protocol.parse_join(protocol.join("alice")[protocol.HEADER.size:]), ("alice", None))
+        self.assertEqual(protocol.parse_join(protocol.join("alice", "k3y")[protocol.HEADER.size:]), ("alice", "k3y"))
+
+    def test_user_input(self):
+        self.assertEqual(protocol.from_user_input(" quit "), protocol.quit())
+        self.assertEqual(protocol.from_user_input("b7"), protocol.shot("B7"))
+        self.assertEqual(protocol.from_user_input("tick 30"), protocol.tick(30))
+        self.assertEqual(protocol.from_user_input("place A1-A5"), protocol.place("A1-A5"))
+        self.assertEqual(protocol.from_user_input("K11"), protocol.chat("K11"))
+
+
+class FrameParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stream = protocol.chat("hello") + protocol.quit() + protocol.shot("A2") + protocol.chat("x" * 300)
+        self.expected = [(protocol.CHAT, b"hello"), (protocol.QUIT, b""), (protocol.SHOT, b"A2"),
+                         (protocol.CHAT, b"x" * 300)]
+
+    def test_glued_frames(self):
+        self.assertEqual(frames(protocol.FrameParser(), self.stream), self.expected)
+
+    def test_every_split(self):
+        """a frame may be cut anywhere, even inside the header"""
+        for cut in range(len(self.stream) + 1):
+            parser = protocol.FrameParser()
+            received = frames(parser, self.stream[:cut]) + frames(parser, self.stream[cut:])
+            self.assertEqual(received, self.expected, "cut at {}".format(cut))
+            self.assertEqual(parser.pending(), b"")
+
+    def test_byte_by_byte(self):
+        parser = protocol.FrameParser()
+        received = []
+        for i in range(len(self.stream)):
+            received += frames(parser, self.stream[i:i + 1])
+        self.assertEqual(received, self.expected)
+
+    def test_pending(self):
+        parser = protocol.FrameParser()
+        self.assertEqual(frames(parser, self.stream[:-10]), self.expected[:3])
+        self.assertEqual(parser.pending(), self.stream[-305:-10])
+
+    def test_too_large(self):
+        parser = protocol.FrameParser(max_payload=10)
+        with self.assertRaises(protocol.ProtocolError):
+            parser.feed(protocol.chat("x" * 11)[:protocol.HEADER.size])   # the header alone is enough
+
+    def test_payload_is_not_copied(self):
+        data = bytearray(protocol.chat("hello"))
+        (_, payload), = protocol.FrameParser().feed(data)
+        data[-1:] = b"!"
+        self.assertEqual(bytes(payload), b"hell!")   # a view into the received data
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+"""
+Compares the line diff engines of differ.py (difflib and myers) on the files of the book.
+
+Every python file is diffed against the file before it (sorted by name) in
+each folder, like differ.py --batch does. data/easygui.py (2400 lines) is
+also diffed against a copy with a few scattered edits, the worst case for
+difflib's SequenceMatcher.
+
+usage: python3 diffbench.py [folder ...]   (default: all folders of the book)
+"""
+
+import os
+import sys
+import glob
+import time
+
+import differ
+
+BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "en")
+REPEAT = 3   # best of
+
+
+def readLines(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return [line.rstrip("\n") for line in f]
+
+def bookPairs(folders):
+    """ (name, before lines, after lines) for every consecutive pair of python files """
+    pairs = []
+    for folder in folders:
+        files = sorted(glob.glob(os.path.join(folder, "*.py")))
+        for file1, file2 in zip(files, files[1:]):
+            pairs.append((os.path.relpath(file2, BOOK), readLines(file1), readLines(file2)))
+    easygui = os.path.join(BOOK, "pygame", "data", "easygui.py")
+    if os.path.exists(easygui):
+        lines = readLines(easygui)
+        edited = list(lines)
+        for i in range(0, len(edited), 97):   # a few small edits all over the file
+            edited[i] = edited[i] + "  # edited"
+        pairs.append(("pygame/data/easygui.py (edited copy)", lines, edited))
+    return pairs
+
+def timeEngine(engine, before, after):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        differ.DIFF_ENGINES[engine](before, after)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main(folders):
+    pairs = bookPairs(folders)
+    totals = dict((engine, 0.0) for engine in differ.DIFF_ENGINES)
+    results = []
+    for name, before, after in pairs:
+        times = dict((engine, timeEngine(engine, before, after)) for engine in differ.DIFF_ENGINES)
+        for engine in times:
+            totals[engine] += times[engine]
+        results.append((times["difflib"], name, len(before), len(after), times))
+    print("%d pairs of files" % len(pairs))
+    print("%-60s %6s %6s %10s %10s" % ("slowest pairs", "lines", "lines", "difflib ms", "myers ms"))
+    for _, name, n, m, times in sorted(results, reverse=True)[:15]:
+        print("%-60s %6d %6d %10.1f %10.1f" % (name[-60:], n, m, 1000 * times["difflib"], 1000 * times["myers"]))
+    print("%-60s %6s %6s %10.1f %10.1f" % ("total", "", "", 1000 * totals["difflib"], 1000 * totals["myers"]))
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        folders = sys.argv[1:]
+    else:
+        folders = sorted(set(os.path.dirname(path) for path in
+                             glob.glob(os.path.join(BOOK, "**", "*.py"), recursive=True)))
+    main(folders)
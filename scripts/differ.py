@@ -25,18 +25,31 @@
 import io
 import os
 import sys
+import glob
+import json
+import time
+import hashlib
 import difflib
 import argparse
+import collections
+import concurrent.futures
 import pygments
 import webbrowser
-from pygments.lexers import guess_lexer_for_filename
+from pygments.lexers import guess_lexer_for_filename, get_lexer_by_name
 from pygments.lexer import RegexLexer
 from pygments.formatters import HtmlFormatter
 from pygments.token import *
+from pygments.token import string_to_tokentype
 
 # Monokai is not quite right yet
 PYGMENTS_STYLES = ["vs", "xcode"] 
 
+# part of the build manifest: pages made by an older version are built again
+DIFFER_VERSION = "3"
+MANIFEST = "differ_manifest.json"
+TOKEN_CACHE_SIZE = 20000   # tokens kept in memory by the LexCache of a process (about 3000 lines of python)
+MYERS_MAX_COST = 256   # edits the myers engine searches before it settles for a good enough diff
+
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html class="no-js">
@@ -149,7 +162,7 @@ class DiffHtmlFormatter(HtmlFormatter):
         self.diffs = diffs
         super(DiffHtmlFormatter, self).__init__(*args, **kwargs)
 
-    def wrap(self, source, outfile):
+    def wrap(self, source, outfile=None):   # pygments >= 2.12 calls wrap(source)
         return self._wrap_code(source)
 
     def getDiffLineNos(self):
@@ -186,7 +199,19 @@ class DiffHtmlFormatter(HtmlFormatter):
         return retlinenos
 
     def _wrap_code(self, source):
-        source = list(source)
+        # the line numbers of one side only go up in the diff: the formatted
+        # lines are taken from source one by one when they are needed, and
+        # source is never collected in memory
+        source = iter(source)
+        taken = [0, None]   # number and (i, t) of the last line taken from source
+
+        def line(no):
+            """ formatted line no, None after the last line """
+            while taken[0] < no:
+                taken[1] = next(source, None)
+                taken[0] += 1
+            return taken[1]
+
         yield 0, '<pre>'
 
         for idx, ((left_no, left_line), (right_no, right_line), change) in enumerate(self.diffs):
@@ -194,11 +219,11 @@ class DiffHtmlFormatter(HtmlFormatter):
             try:
                 if self.isLeft:
                     if change:
-                        if isinstance(left_no, int) and isinstance(right_no, int) and left_no <= len(source):
-                            i, t = source[left_no - 1]
+                        if isinstance(left_no, int) and isinstance(right_no, int) and line(left_no) is not None:
+                            i, t = line(left_no)
                             t = '<span class="left_diff_change">' + t + "</span>"
-                        elif isinstance(left_no, int) and not isinstance(right_no, int) and left_no <= len(source):
-                            i, t = source[left_no - 1]
+                        elif isinstance(left_no, int) and not isinstance(right_no, int) and line(left_no) is not None:
+                            i, t = line(left_no)
                             t = '<span class="left_diff_del">' + t + "</span>"
                         elif not isinstance(left_no, int) and isinstance(right_no, int):
                             i, t = 1, left_line
@@ -206,27 +231,27 @@ class DiffHtmlFormatter(HtmlFormatter):
                         else:
                             raise
                     else:
-                        if left_no <= len(source):
-                            i, t = source[left_no - 1]
+                        if line(left_no) is not None:
+                            i, t = line(left_no)
                         else:
                             i = 1
                             t = left_line
                 else:
                     if change:
-                        if isinstance(left_no, int) and isinstance(right_no, int) and right_no <= len(source):
-                            i, t = source[right_no - 1]
+                        if isinstance(left_no, int) and isinstance(right_no, int) and line(right_no) is not None:
+                            i, t = line(right_no)
                             t = '<span class="right_diff_change">' + t + "</span>"
                         elif isinstance(left_no, int) and not isinstance(right_no, int):
                             i, t = 1, right_line
                             t = '<span class="right_diff_del">' + t + "</span>"
-                        elif not isinstance(left_no, int) and isinstance(right_no, int) and right_no <= len(source):
-                            i, t = source[right_no - 1]
+                        elif not isinstance(left_no, int) and isinstance(right_no, int) and line(right_no) is not None:
+                            i, t = line(right_no)
                             t = '<span class="right_diff_add">' + t + "</span>"
                         else:
                             raise
                     else:
-                        if right_no <= len(source):
-                            i, t = source[right_no - 1]
+                        if line(right_no) is not None:
+                            i, t = line(right_no)
                         else:
                             i = 1
                             t = right_line
@@ -234,35 +259,16 @@ class DiffHtmlFormatter(HtmlFormatter):
             except:
                 # print "WARNING! failed to enumerate diffs fully!"
                 pass  # this is expected sometimes
+        for rest in source:   # lines after the last one of the diff: finish the token stream (see LexCache)
+            pass
         yield 0, '\n</pre>'
 
     def _wrap_tablelinenos(self, inner):
-        dummyoutfile = io.StringIO()
-        lncount = 0
-        for t, line in inner:
-            if t:
-                lncount += 1
-
-            # compatibility Python v2/v3
-            if sys.version_info > (3,0):
-                dummyoutfile.write(line)
-            else:
-                dummyoutfile.write(unicode(line))
-
-        fl = self.linenostart
-        mw = len(str(lncount + fl - 1))
-        sp = self.linenospecial
-        st = self.linenostep
-        la = self.lineanchors
-        aln = self.anchorlinenos
+        # the line numbers come from the diff, not from the code: they can be
+        # written first, and the code is passed through piece by piece without
+        # collecting it in memory
         nocls = self.noclasses
 
-        lines = []
-        for i in self.getDiffLineNos():
-            lines.append('%s' % (i,))
-
-        ls = ''.join(lines)
-
         # in case you wonder about the seemingly redundant <div> here: since the
         # content in the other cell also is wrapped in a div, some browsers in
         # some configurations seem to mess up the formatting...
@@ -270,16 +276,262 @@ class DiffHtmlFormatter(HtmlFormatter):
             yield 0, ('<table class="%stable">' % self.cssclass +
                       '<tr><td><div class="linenodiv" '
                       'style="background-color: #f0f0f0; padding-right: 10px">'
-                      '<pre style="line-height: 125%">' +
-                      ls + '</pre></div></td><td class="code">')
+                      '<pre style="line-height: 125%">')
         else:
             yield 0, ('<table class="%stable">' % self.cssclass +
-                      '<tr><td class="linenos"><div class="linenodiv"><pre>' +
-                      ls + '</pre></div></td><td class="code">')
-        yield 0, dummyoutfile.getvalue()
+                      '<tr><td class="linenos"><div class="linenodiv"><pre>')
+        for no in self.getDiffLineNos():
+            if no is not None:
+                yield 0, no
+        yield 0, '</pre></div></td><td class="code">'
+        for t, line in inner:
+            yield 0, line
         yield 0, '</td></tr></table>'
 
 
+def _middleSnake(a, alo, ahi, b, blo, bhi):
+    """
+    Myers: searches the shortest edit script from both ends at once until the
+    two searches meet. returns (x, y, u, v, d): the snake (diagonal run of equal
+    lines) from a[x]/b[y] to a[u]/b[v] in the middle of it, and the number of edits d.
+    Files that have little in common would cost O(N*N): after MYERS_MAX_COST
+    edits the search gives up and splits at the furthest point reached so far
+    (like git does), the diff is then not always the shortest one.
+    """
+    n = ahi - alo
+    m = bhi - blo
+    delta = n - m
+    odd = delta & 1
+    size = n + m + 2
+    forward = [0] * (2 * size)    # furthest x on diagonal k (negative k wraps around)
+    backward = [0] * (2 * size)   # same, searching from the end
+    for d in range((n + m + 1) // 2 + 1):
+        if d > MYERS_MAX_COST:
+            # the point of the forward search that got furthest (x + y) inside both files
+            points = [(forward[k] * 2 - k, forward[k], forward[k] - k) for k in range(-d + 1, d, 2)
+                      if forward[k] <= n and 0 <= forward[k] - k <= m]
+            _, x, y = max(points) if points else (0, n // 2, m // 2)
+            if x + y in (0, n + m):
+                x, y = n // 2, m // 2
+            return alo + x, blo + y, alo + x, blo + y, d
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[k - 1] < forward[k + 1]):
+                x = forward[k + 1]
+            else:
+                x = forward[k - 1] + 1
+            y = x - k
+            startx, starty = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            forward[k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + backward[delta - k] >= n:
+                return alo + startx, blo + starty, alo + x, blo + y, 2 * d - 1
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[k - 1] < backward[k + 1]):
+                x = backward[k + 1]
+            else:
+                x = backward[k - 1] + 1
+            y = x - k
+            startx, starty = x, y
+            while x < n and y < m and a[ahi - x - 1] == b[bhi - y - 1]:
+                x += 1
+                y += 1
+            backward[k] = x
+            if not odd and -d <= delta - k <= d and x + forward[delta - k] >= n:
+                return ahi - x, bhi - y, ahi - startx, bhi - starty, 2 * d
+
+def _myersBlocks(a, alo, ahi, b, blo, bhi, blocks):
+    """ appends the matching blocks (i, j, size) of a[alo:ahi] and b[blo:bhi] to blocks, in order """
+    # common beginning and end cost nothing: most steps of the book only change a few lines
+    start = 0
+    while alo + start < ahi and blo + start < bhi and a[alo + start] == b[blo + start]:
+        start += 1
+    if start:
+        blocks.append((alo, blo, start))
+        alo += start
+        blo += start
+    end = 0
+    while alo < ahi - end and blo < bhi - end and a[ahi - end - 1] == b[bhi - end - 1]:
+        end += 1
+    ahi -= end
+    bhi -= end
+    if alo < ahi and blo < bhi:
+        x, y, u, v, d = _middleSnake(a, alo, ahi, b, blo, bhi)
+        if d > 1:
+            _myersBlocks(a, alo, x, b, blo, y, blocks)
+            if u > x:
+                blocks.append((x, y, u - x))
+            _myersBlocks(a, u, ahi, b, v, bhi, blocks)
+        elif u > x:   # one line inserted or deleted, the rest is the snake
+            blocks.append((x, y, u - x))
+    if end:
+        blocks.append((ahi, bhi, end))
+
+def myersMdiff(fromlines, tolines):
+    """
+    Same (left, right, changed) rows as difflib._mdiff, computed with the
+    O(ND) algorithm of Myers in linear space. Fast when few lines differ, and it
+    does not slow down on repetitive files like SequenceMatcher. Changed lines are
+    shown as a deleted and an added line side by side, without marks inside the line.
+    """
+    ids = {}   # comparing small ints is faster than comparing lines
+    a = [ids.setdefault(line, len(ids)) for line in fromlines]
+    b = [ids.setdefault(line, len(ids)) for line in tolines]
+    blocks = []
+    _myersBlocks(a, 0, len(a), b, 0, len(b), blocks)
+    blocks.append((len(a), len(b), 0))
+    rows = []
+    i = j = 0
+    for bi, bj, size in blocks:
+        deleted = range(i, bi)
+        added = range(j, bj)
+        for k in range(max(len(deleted), len(added))):
+            left = (deleted[k] + 1, '\0-' + fromlines[deleted[k]] + '\1') if k < len(deleted) else ('', '\n')
+            right = (added[k] + 1, '\0+' + tolines[added[k]] + '\1') if k < len(added) else ('', '\n')
+            rows.append((left, right, True))
+        for k in range(size):
+            rows.append(((bi + k + 1, fromlines[bi + k]), (bj + k + 1, tolines[bj + k]), False))
+        i, j = bi + size, bj + size
+    return rows
+
+def difflibMdiff(fromlines, tolines):
+    """ the original engine: difflib's side by side diff, with marks for changes inside a line """
+    return list(difflib._mdiff(fromlines, tolines, None,
+                               linejunk=None, charjunk=difflib.IS_CHARACTER_JUNK))
+
+DIFF_ENGINES = {"difflib": difflibMdiff, "myers": myersMdiff}
+
+
+class LexCache(object):
+    """
+    Remembers which lexer was guessed for a source text and the tokens of that
+    text, keyed by a hash of the content. In a batch run every step file is the
+    "after" of one diff and the "before" of the next, with the cache it is
+    guessed and tokenized only once. With a directory the entries are also kept
+    on disk, shared by the worker processes and by later runs: one json file per
+    content hash for the lexers, one file per content hash and lexer with one
+    token per line for the tokens.
+
+    Tokens are handed out as a stream while they are lexed (or read from disk).
+    Only files of up to maxTokens tokens are also kept in memory, and only the
+    last used ones up to maxTokens together: big files are lexed again (or read
+    from disk) instead of filling the memory of every worker.
+    """
+
+    def __init__(self, directory=None, maxTokens=TOKEN_CACHE_SIZE):
+        self.directory = directory
+        self.maxTokens = maxTokens
+        self.lexers = {}   # (file name, content hash): lexer
+        self.tokens = collections.OrderedDict()   # (lexer name, content hash): list of (tokentype, text), oldest first
+        self.tokenCount = 0   # tokens in self.tokens
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _load(self, digest):
+        if not self.directory:
+            return {}
+        try:
+            with io.open(os.path.join(self.directory, digest + ".json")) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, digest, entry):
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, digest + ".json")
+        temp = "%s.%d.tmp" % (path, os.getpid())   # several processes may write the same entry
+        with io.open(temp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temp, path)
+
+    def getLexer(self, filename, code, verbose=False):
+        """ guess_lexer_for_filename, once per file name and content """
+        digest = hashlib.sha1(code.encode("utf-8")).hexdigest()
+        key = (os.path.basename(filename), digest)
+        if key in self.lexers:
+            return self.lexers[key]
+        alias = self._load(digest).get("lexers", {}).get(key[0])
+        if alias is not None:
+            lexer = DefaultLexer() if alias == "default" else get_lexer_by_name(alias)
+        else:
+            try:
+                lexer = guess_lexer_for_filename(filename, code)
+            except pygments.util.ClassNotFound:
+                if verbose:
+                    print("No Lexer Found! Using default...")
+                lexer = DefaultLexer()
+            if self.directory:
+                entry = self._load(digest)
+                entry.setdefault("lexers", {})[key[0]] = lexer.aliases[0]
+                self._save(digest, entry)
+        self.lexers[key] = lexer
+        return lexer
+
+    def getTokens(self, lexer, code):
+        """ the token stream of code, lexed only once per lexer and content """
+        digest = hashlib.sha1(code.encode("utf-8")).hexdigest()
+        name = lexer.aliases[0]
+        key = (name, digest)
+        if key in self.tokens:
+            self.tokens.move_to_end(key)
+            return iter(self.tokens[key])
+        path = os.path.join(self.directory, "%s.%s.tokens" % (digest, name)) if self.directory else None
+        if path and os.path.exists(path):
+            return self._streamTokens(key, self._readTokens(path), None)
+        return self._streamTokens(key, lexer.get_tokens(code), path)
+
+    def _readTokens(self, path):
+        with io.open(path) as f:
+            for line in f:
+                ttype, value = json.loads(line)
+                yield string_to_tokentype(ttype), value
+
+    def _streamTokens(self, key, tokens, path):
+        """ passes tokens on, writes them to path (if given) and keeps them in memory if there are not too many """
+        kept = []
+        out = None
+        done = False
+        if path:
+            temp = "%s.%d.tmp" % (path, os.getpid())   # several processes may write the same file
+            out = io.open(temp, 'w')
+        try:
+            for token in tokens:
+                if kept is not None:
+                    kept.append(token)
+                    if len(kept) > self.maxTokens:
+                        kept = None   # too big for the memory cache
+                if out:
+                    out.write(json.dumps((str(token[0]), token[1])) + "\n")
+                yield token
+            done = True
+        finally:
+            if out:
+                out.close()
+                if done:
+                    os.replace(temp, path)
+                else:   # only complete token files
+                    os.remove(temp)
+        if kept is not None:
+            self.tokens[key] = kept
+            self.tokenCount += len(kept)
+            while self.tokenCount > self.maxTokens:
+                self.tokenCount -= len(self.tokens.popitem(last=False)[1])
+
+
+LEX_CACHE = None   # LexCache of this process, see getLexCache
+
+def getLexCache(options):
+    global LEX_CACHE
+    directory = getattr(options, "cache_dir", None)
+    # a single diff never sees a file twice: only batch runs keep tokens in memory
+    maxTokens = TOKEN_CACHE_SIZE if getattr(options, "batch", False) or getattr(options, "pairs", None) else 0
+    if LEX_CACHE is None or LEX_CACHE.directory != directory or LEX_CACHE.maxTokens != maxTokens:
+        LEX_CACHE = LexCache(directory, maxTokens)
+    return LEX_CACHE
+
+
 class CodeDiff(object):
     """
     Manages a pair of source files and generates a single html diff page comparing
@@ -293,7 +545,7 @@ class CodeDiff(object):
 
     def __init__(self, fromfile, tofile, fromtxt=None, totxt=None, name=None):
         self.filename = name
-        self.name2 = fromfile+" -> diff -> "+tofile
+        self.name2 = os.path.basename(fromfile)+" -> diff -> "+os.path.basename(tofile)
         self.fromfile = fromfile
         if fromtxt == None:
             try:
@@ -320,7 +572,7 @@ class CodeDiff(object):
             self.tolines = [n + "\n" for n in totxt.split("\n")]
         self.rightcode = "".join(self.tolines)
 
-    def getDiffDetails(self, fromdesc='', todesc='', context=False, numlines=5, tabSize=8):
+    def getDiffDetails(self, fromdesc='', todesc='', context=False, numlines=5, tabSize=8, engine="difflib"):
         # change tabs to spaces before it gets more difficult after we insert
         # markkup
         def expand_tabs(line):
@@ -342,12 +594,28 @@ class CodeDiff(object):
         else:
             context_lines = None
 
-        diffs = difflib._mdiff(self.fromlines, self.tolines, context_lines,
-                               linejunk=None, charjunk=difflib.IS_CHARACTER_JUNK)
-        return list(diffs)
+        if context_lines is not None or engine == "difflib":
+            diffs = difflib._mdiff(self.fromlines, self.tolines, context_lines,
+                                   linejunk=None, charjunk=difflib.IS_CHARACTER_JUNK)
+            return list(diffs)
+        return DIFF_ENGINES[engine](self.fromlines, self.tolines)
 
     def format(self, options):
-        self.diffs = self.getDiffDetails(self.fromfile, self.tofile)
+        """ builds the whole page in self.htmlContents. see stream() for big files """
+        page = io.StringIO()
+        self.stream(page, options)
+        self.htmlContents = page.getvalue()
+
+    def stream(self, outfile, options):
+        """
+        writes the page to outfile (an open text file) while it is generated: the
+        template up to the old code, the old code, the template between, the new
+        code and the rest of the template. the source lines and the line diff are
+        kept in memory, the tokens and the html are passed through line by line
+        (in batch runs small files keep their tokens in the LexCache).
+        """
+        self.diffs = self.getDiffDetails(self.fromfile, self.tofile,
+                                         engine=getattr(options, "engine", "difflib"))
 
         if options.verbose:
             for diff in self.diffs:
@@ -356,27 +624,9 @@ class CodeDiff(object):
         fields = ((self.leftcode, True, self.fromfile),
                   (self.rightcode, False, self.tofile))
 
-        codeContents = []
-        for (code, isLeft, filename) in fields:
-
-            inst = DiffHtmlFormatter(isLeft,
-                                     self.diffs,
-                                     nobackground=False,
-                                     linenos=True,
-                                     style=options.syntax_css)
-
-            try:
-                self.lexer = guess_lexer_for_filename(self.filename, code)
-
-            except pygments.util.ClassNotFound:
-                if options.verbose:
-                    print("No Lexer Found! Using default...")
-
-                self.lexer = DefaultLexer()
-
-            formatted = pygments.highlight(code, self.lexer, inst)
-
-            codeContents.append(formatted)
+        # one lexer for both sides, guessed from the "after" file
+        cache = getLexCache(options)
+        self.lexer = cache.getLexer(self.filename, self.rightcode, options.verbose)
 
         answers = {
             "html_title":     self.filename,
@@ -384,14 +634,24 @@ class CodeDiff(object):
             "pygments_css":   self.pygmentsCssFile % options.syntax_css,
             "diff_css":       self.diffCssFile,
             "page_title":     self.name2,
-            "original_code":  codeContents[0],
-            "modified_code":  codeContents[1],
             "jquery_js":      self.jqueryJsFile,
             "diff_js":        self.diffJsFile,
             "page_width":     "page-80-width" if options.print_width else "page-full-width"
         }
+        head, rest = HTML_TEMPLATE.split("%(original_code)s")
+        middle, tail = rest.split("%(modified_code)s")
+
+        outfile.write(head % answers)
+        for (code, isLeft, filename), after in zip(fields, (middle, tail)):
+
+            inst = DiffHtmlFormatter(isLeft,
+                                     self.diffs,
+                                     nobackground=False,
+                                     linenos=True,
+                                     style=options.syntax_css)
 
-        self.htmlContents = HTML_TEMPLATE % answers
+            pygments.format(cache.getTokens(self.lexer, code), inst, outfile)
+            outfile.write(after % answers)
 
     def write(self, path):
         fh = io.open(path, 'w')
@@ -400,9 +660,138 @@ class CodeDiff(object):
 
 
 def main(file1, file2, outputpath, options):
-    codeDiff = CodeDiff(file1, file2, name=file2)
-    codeDiff.format(options)
-    codeDiff.write(outputpath)
+    codeDiff = CodeDiff(file1, file2, name=os.path.basename(file2))
+    with io.open(outputpath, 'w') as fh:
+        codeDiff.stream(fh, options)
+
+def outputName(file1, file2):
+    """ step002d_display_function.py, step002e_asterix.py -> step002d_step002e.html (links in the wiki use these names) """
+    return os.path.basename(file1)[:8] + "_" + os.path.basename(file2)[:8] + ".html"
+
+def outputNames(pairs):
+    """
+    the page name of every pair. only pairs whose names collide get a hash of
+    their paths added, whatever the order of the pairs; all others keep the
+    name of outputName.
+    """
+    names = [outputName(file1, file2) for file1, file2 in pairs]
+    counts = {}
+    for name in names:
+        counts[name] = counts.get(name, 0) + 1
+    for i, (file1, file2) in enumerate(pairs):
+        if counts[names[i]] > 1:
+            digest = hashlib.sha1((os.path.abspath(file1) + "\n" + os.path.abspath(file2)).encode("utf-8")).hexdigest()
+            names[i] = names[i][:-len(".html")] + "_" + digest[:8] + ".html"
+    return names
+
+def findPairs(paths, pattern):
+    """
+    Works out the (before, after) pairs of a batch run. Directories are expanded
+    to the files matching pattern, sorted by name. Every file is diffed against
+    the file before it, in the given order.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            files.append(path)
+    return list(zip(files, files[1:]))
+
+def readPairs(pairsfile):
+    """
+    reads explicit pairs, one 'before after' per line. # starts a comment.
+    file names with spaces need a tab between them (see similar.py)
+    """
+    pairs = []
+    with io.open(pairsfile) as f:
+        for line in f:
+            if "\t" in line:
+                line = [part.strip() for part in line.split("\t") if not part.strip().startswith("#")]
+            else:
+                line = line.split("#")[0].split()
+            if len(line) == 2:
+                pairs.append((line[0], line[1]))
+    return pairs
+
+def renderPair(job):
+    """ runs in a worker process: one diff page """
+    file1, file2, outputpath, options = job
+    main(file1, file2, outputpath, options)
+    return outputpath
+
+def writeIndex(pages, indexpath):
+    """ html page with a link to every diff page, in the order of the pairs """
+    links = []
+    for file1, file2, outputpath in pages:
+        href = os.path.relpath(outputpath, os.path.dirname(os.path.abspath(indexpath)))
+        links.append('<li><a href="%s">%s &rarr; %s</a></li>' % (
+            href, os.path.basename(file1), os.path.basename(file2)))
+    with io.open(indexpath, 'w') as fh:
+        fh.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>diffs</title></head>\n'
+                 '<body>\n<ul>\n%s\n</ul>\n</body></html>\n' % "\n".join(links))
+
+def fileHash(path):
+    with io.open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def pageKey(file1, file2, options):
+    """ everything a diff page depends on: both inputs (the file names are in the page title), the style and the differ version """
+    return {"files": [os.path.basename(file1), os.path.basename(file2)], "before": fileHash(file1), "after": fileHash(file2),
+            "syntax_css": options.syntax_css, "print_width": bool(options.print_width),
+            "engine": getattr(options, "engine", "difflib"),
+            "version": DIFFER_VERSION}
+
+def loadManifest(outputdir):
+    """ the manifest of a directory: page file name -> pageKey of the inputs it was made from """
+    try:
+        with io.open(os.path.join(outputdir, MANIFEST)) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+def saveManifest(outputdir, manifest):
+    path = os.path.join(outputdir, MANIFEST)
+    with io.open(path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def isUpToDate(manifest, outputpath, key):
+    return manifest.get(os.path.basename(outputpath)) == key and os.path.exists(outputpath)
+
+def batch(pairs, outputdir, options):
+    """
+    renders the diff pages of all pairs in a process pool, then writes the index.
+    pages whose inputs did not change since the last run (see the manifest) are skipped.
+    """
+    start = time.time()
+    if not os.path.isdir(outputdir):
+        os.makedirs(outputdir)
+    manifest = {} if options.force else loadManifest(outputdir)
+    jobs = []
+    todo = []
+    for (file1, file2), name in zip(pairs, outputNames(pairs)):
+        job = (file1, file2, os.path.join(outputdir, name), options)
+        jobs.append(job)
+        key = pageKey(file1, file2, options)
+        if not isUpToDate(manifest, job[2], key):
+            todo.append((job, key))
+    if todo:
+        workers = options.jobs or os.cpu_count() or 1
+        # neighbouring pairs share a file: give them to the same worker, so its LexCache knows the file
+        chunksize = max(1, len(todo) // (4 * workers))
+        with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+            jobs_todo = [job for job, _ in todo]
+            for outputpath, (job, key) in zip(pool.map(renderPair, jobs_todo, chunksize=chunksize), todo):
+                manifest[os.path.basename(outputpath)] = key
+                if options.verbose:
+                    print("wrote %s" % outputpath)
+        saveManifest(outputdir, manifest)
+    indexpath = os.path.join(outputdir, options.index)
+    writeIndex([(file1, file2, outputpath) for file1, file2, outputpath, _ in jobs], indexpath)
+    print("%d diff pages written, %d unchanged, %s written in %.1f seconds" % (
+        len(todo), len(jobs) - len(todo), indexpath, time.time() - start))
+    return indexpath
 
 def show(outputpath):
     path = os.path.abspath(outputpath)
@@ -410,7 +799,8 @@ def show(outputpath):
 
 if __name__ == "__main__":
     description = """Given two source files this application\
-creates an html page which highlights the differences between the two. """
+creates an html page which highlights the differences between the two. \
+With --batch it creates the diff pages for every consecutive pair of many files. """
 
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('-s', '--show', action='store_true',
@@ -420,15 +810,42 @@ creates an html page which highlights the differences between the two. """
     parser.add_argument('-c', '--syntax-css', action='store', default="vs",
         help='Pygments CSS for code syntax highlighting. Can be one of: %s' % str(PYGMENTS_STYLES))
     parser.add_argument('-v', '--verbose', action='store_true', help='show verbose output.')
-    parser.add_argument('file1', help='source file to compare ("before" file).')
-    parser.add_argument('file2', help='source file to compare ("after" file).')
+    parser.add_argument('-e', '--engine', action='store', default="difflib", choices=sorted(DIFF_ENGINES),
+        help='line diff algorithm: difflib (marks changes inside lines) or myers (much faster on big files).')
+    parser.add_argument('-b', '--batch', action='store_true',
+        help='diff every file against the file before it. files may be directories (see --pattern).')
+    parser.add_argument('--pairs', action='store',
+        help='batch mode: text file with one "before after" pair per line, instead of consecutive files.')
+    parser.add_argument('--pattern', action='store', default="step*.py",
+        help='batch mode: files to take from a directory, sorted by name (default: step*.py).')
+    parser.add_argument('-o', '--output-dir', action='store', default=".",
+        help='batch mode: directory for the diff pages and the index.')
+    parser.add_argument('-i', '--index', action='store', default="index.html",
+        help='batch mode: file name of the index page.')
+    parser.add_argument('-j', '--jobs', action='store', type=int, default=0,
+        help='batch mode: number of worker processes (default: one per cpu).')
+    parser.add_argument('--cache-dir', action='store',
+        help='keep guessed lexers and tokens of every source file in this directory, for later runs.')
+    parser.add_argument('-f', '--force', action='store_true',
+        help='batch mode: build all pages again, even if their inputs did not change (see %s).' % MANIFEST)
+    parser.add_argument('files', nargs='*',
+        help='source files to compare ("before" file, "after" file), or in batch mode all step files.')
 
     args = parser.parse_args()
 
     if args.syntax_css not in PYGMENTS_STYLES:
         raise ValueError("Syntax CSS (-c) must be one of %r." % PYGMENTS_STYLES)
 
-    outputpath = args.file1[:8]+"_"+args.file2[:8]+".html" #"index.html"
-    main(args.file1, args.file2, outputpath, args)
+    if args.batch or args.pairs:
+        pairs = readPairs(args.pairs) if args.pairs else findPairs(args.files, args.pattern)
+        if not pairs:
+            parser.error("nothing to diff: need at least two files")
+        outputpath = batch(pairs, args.output_dir, args)
+    else:
+        if len(args.files) != 2:
+            parser.error("need exactly two files (or --batch)")
+        file1, file2 = args.files
+        outputpath = outputName(file1, file2) #"index.html"
+        main(file1, file2, outputpath, args)
     if args.show:
         show(outputpath)
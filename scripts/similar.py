@@ -0,0 +1,143 @@
+"""
+Finds for every source file its most similar predecessor and writes a diff
+graph (pairs of files) for differ.py --pairs.
+
+Comparing every file with every other file is quadratic. Instead every file
+gets a MinHash signature of its shingles (runs of SHINGLE tokens): with one
+hash per shingle, the shingles are spread over SIGNATURE bins and each bin
+keeps its smallest hash (one permutation hashing). Two files have the same
+value in a bin with a probability of about their Jaccard similarity. The
+signature is cut into BANDS bands; files that agree in all values of at
+least one band land in the same bucket and become candidates (locality
+sensitive hashing). Only candidates are compared exactly.
+
+The predecessor of a file is the most similar candidate that comes before
+it in name order (002_ before 003_, template_002 before template_003).
+Files without a similar predecessor start a new line of steps.
+
+usage: python3 similar.py ../en/pygame -o pairs.txt
+       python3 differ.py --pairs pairs.txt -o diffs
+"""
+
+import os
+import re
+import sys
+import glob
+import hashlib
+import argparse
+
+SHINGLE = 3        # tokens per shingle
+SIGNATURE = 64     # minhash values per file
+BANDS = 32         # SIGNATURE / BANDS values per band: files with jaccard >= about 0.2 become candidates
+THRESHOLD = 0.25   # smaller similarity: no predecessor
+
+TOKEN = re.compile(r"\w+|[^\w\s]")
+EMPTY = 2 ** 64    # value of a bin without shingle
+
+
+def shingles(text):
+    """ set of 64 bit hashes of all runs of SHINGLE tokens. comments and spacing count too little to matter """
+    tokens = TOKEN.findall(text)
+    if len(tokens) < SHINGLE:
+        tokens = tokens + [""] * (SHINGLE - len(tokens))
+    result = set()
+    for i in range(len(tokens) - SHINGLE + 1):
+        digest = hashlib.blake2b(" ".join(tokens[i:i + SHINGLE]).encode("utf-8"), digest_size=8).digest()
+        result.add(int.from_bytes(digest, "little"))
+    return result
+
+def signature(hashes):
+    """ one permutation minhash: the bin is chosen by the low bits, the bin keeps its smallest hash """
+    bins = [EMPTY] * SIGNATURE
+    for h in hashes:
+        i = h % SIGNATURE
+        if h < bins[i]:
+            bins[i] = h
+    # an empty bin borrows the value of the next filled bin, so that small files still compare well
+    filled = [i for i in range(SIGNATURE) if bins[i] != EMPTY]
+    if filled:
+        for i in range(SIGNATURE):
+            if bins[i] == EMPTY:
+                j = next((f for f in filled if f > i), filled[0])
+                bins[i] = bins[j] ^ (i + 1)   # not equal to the borrowed value itself
+    return bins
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / float(len(a | b))
+
+def candidates(signatures, bands=BANDS):
+    """ LSH: index -> set of indexes of files that share a bucket in at least one band """
+    rows = SIGNATURE // bands
+    result = dict((i, set()) for i in range(len(signatures)))
+    for band in range(bands):
+        buckets = {}
+        for i, sig in enumerate(signatures):
+            buckets.setdefault(tuple(sig[band * rows:(band + 1) * rows]), []).append(i)
+        for members in buckets.values():
+            if len(members) > 1:
+                for i in members:
+                    result[i].update(members)
+    for i in result:
+        result[i].discard(i)
+    return result
+
+def diffGraph(files, threshold=THRESHOLD, bands=BANDS):
+    """ list of (file, predecessor or None, similarity), in name order """
+    files = sorted(files)
+    sets = []
+    for path in files:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            sets.append(shingles(f.read()))
+    near = candidates([signature(s) for s in sets], bands)
+    graph = []
+    for i, path in enumerate(files):
+        best, parent = 0.0, None
+        for j in near[i]:
+            if j < i:
+                similarity = jaccard(sets[i], sets[j])
+                if similarity > best:
+                    best, parent = similarity, files[j]
+        if best < threshold:
+            best, parent = 0.0, None
+        graph.append((path, parent, best))
+    return graph
+
+def writePairs(graph, out):
+    """ one 'before<TAB>after' line per pair (file names may contain spaces), for differ.py --pairs """
+    for path, parent, similarity in graph:
+        if parent is None:
+            out.write("# %s: no similar predecessor\n" % path)
+        else:
+            out.write("%s\t%s\t# %.2f\n" % (parent, path, similarity))
+
+def findFiles(paths, pattern):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    return files
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="suggests which files to diff: the most similar predecessor of every file.")
+    parser.add_argument('--pattern', action='store', default="*.py",
+        help='files to take from a directory (default: *.py).')
+    parser.add_argument('-t', '--threshold', action='store', type=float, default=THRESHOLD,
+        help='smallest similarity (jaccard of the shingles, 0..1) for a predecessor (default: %s).' % THRESHOLD)
+    parser.add_argument('-b', '--bands', action='store', type=int, default=BANDS, choices=[8, 16, 32],
+        help='lsh bands: more bands find less similar candidates, but compare more pairs (default: %d).' % BANDS)
+    parser.add_argument('-o', '--output', action='store',
+        help='write the pairs to this file instead of the screen.')
+    parser.add_argument('paths', nargs='+', help='source files or directories.')
+    args = parser.parse_args()
+
+    graph = diffGraph(findFiles(args.paths, args.pattern), args.threshold, args.bands)
+    if args.output:
+        with open(args.output, "w") as out:
+            writePairs(graph, out)
+        print("%d pairs written to %s" % (sum(1 for _, parent, _ in graph if parent), args.output))
+    else:
+        writePairs(graph, sys.stdout)
@@ -0,0 +1,97 @@
+""" unit tests for the myers engine of differ.py, against a plain LCS. run: python3 -m pytest (or python3 -m unittest) """
+import random
+import unittest
+
+import differ
+
+
+def lcsLength(a, b):
+    """ reference: length of the longest common subsequence, O(N*M) dynamic programming """
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        current = [0]
+        for j, y in enumerate(b):
+            current.append(previous[j] + 1 if x == y else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def myersBlocks(a, b):
+    blocks = []
+    differ._myersBlocks(a, 0, len(a), b, 0, len(b), blocks)
+    return blocks
+
+
+def randomLines(rng, count, alphabet):
+    return [rng.choice(alphabet) for _ in range(count)]
+
+
+class MyersTest(unittest.TestCase):
+
+    def assertValidBlocks(self, a, b, blocks):
+        """ every block really matches, and the blocks follow each other in both files """
+        i = j = 0
+        for bi, bj, size in blocks:
+            self.assertGreater(size, 0)
+            self.assertGreaterEqual(bi, i)
+            self.assertGreaterEqual(bj, j)
+            self.assertEqual(a[bi:bi + size], b[bj:bj + size])
+            i, j = bi + size, bj + size
+        self.assertLessEqual(i, len(a))
+        self.assertLessEqual(j, len(b))
+
+    def test_shortest_edit_script(self):
+        """ myers finds a longest common subsequence, like the reference """
+        rng = random.Random(19)
+        for _ in range(300):
+            a = randomLines(rng, rng.randint(0, 40), "abcd")
+            b = randomLines(rng, rng.randint(0, 40), "abcd")
+            blocks = myersBlocks(a, b)
+            self.assertValidBlocks(a, b, blocks)
+            self.assertEqual(sum(size for _, _, size in blocks), lcsLength(a, b), (a, b))
+
+    def test_edited_copy(self):
+        """ the usual case: a few lines of a long file changed """
+        rng = random.Random(7)
+        for _ in range(50):
+            a = randomLines(rng, 200, "abcdefghij")
+            b = list(a)
+            for _ in range(rng.randint(1, 10)):
+                position = rng.randint(0, len(b))
+                if rng.random() < 0.5 and position < len(b):
+                    del b[position]
+                else:
+                    b.insert(position, rng.choice("xyz"))
+            blocks = myersBlocks(a, b)
+            self.assertValidBlocks(a, b, blocks)
+            self.assertEqual(sum(size for _, _, size in blocks), lcsLength(a, b))
+
+    def test_cost_limit(self):
+        """ above MYERS_MAX_COST the diff may be longer than necessary, but it is still correct """
+        rng = random.Random(3)
+        limit, differ.MYERS_MAX_COST = differ.MYERS_MAX_COST, 4
+        try:
+            for _ in range(100):
+                a = randomLines(rng, rng.randint(0, 60), "abc")
+                b = randomLines(rng, rng.randint(0, 60), "abc")
+                self.assertValidBlocks(a, b, myersBlocks(a, b))
+        finally:
+            differ.MYERS_MAX_COST = limit
+
+    def test_rows(self):
+        """ the left column shows every old line, the right column every new line, in order """
+        fromlines = ["import os\n", "a = 1\n", "b = 2\n", "print(a)\n"]
+        tolines = ["import os\n", "import sys\n", "a = 1\n", "print(a + 1)\n"]
+        rows = differ.myersMdiff(fromlines, tolines)
+        left = [text.strip("\0+-\1") for (number, text), _, _ in rows if number != '']
+        right = [text.strip("\0+-\1") for _, (number, text), _ in rows if number != '']
+        self.assertEqual(left, fromlines)
+        self.assertEqual(right, tolines)
+        self.assertEqual([changed for _, _, changed in rows], [False, True, False, True, True])
+        for (number, text), (number2, text2), changed in rows:
+            if not changed:
+                self.assertEqual(text, text2)
+
+
+if __name__ == "__main__":
+    unittest.main()